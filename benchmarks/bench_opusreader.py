@@ -0,0 +1,93 @@
+"""Pages per second of OggPageReader against OggStream.iter_pages.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_opusreader
+"""
+
+import argparse
+import io
+import os
+import time
+from threading import Thread
+from typing import IO
+
+from src.utils.opusreader import OggPageReader, OggStream
+
+from .synthetic import make_opus_stream
+
+
+def open_stream(data: bytes, use_pipe: bool) -> IO[bytes]:
+    """Serve `data` like ffmpeg's stdout would: through a pipe, buffered."""
+    if not use_pipe:
+        return io.BufferedReader(io.BytesIO(data))
+
+    read_fd, write_fd = os.pipe()
+
+    def writer():
+        with open(write_fd, "wb") as f:
+            f.write(data)
+
+    Thread(target=writer, daemon=True).start()
+    return open(read_fd, "rb")
+
+
+def bench_oggstream(stream: IO[bytes]) -> int:
+    # what oggstream_reader did with every page before OggPageReader
+    count = 0
+    for page in OggStream(stream).iter_pages():
+        b"OggS" + page.header + page.segtable + page.data
+        count += 1
+    return count
+
+
+def bench_pagereader(stream: IO[bytes]) -> int:
+    count = 0
+    for page in OggPageReader(stream).iter_pages():
+        bytes(page)
+        count += 1
+    return count
+
+
+def run(
+    seconds: float, page_duration: float, rounds: int, use_pipe: bool = True
+) -> dict[str, float]:
+    data = make_opus_stream(seconds, page_duration=page_duration)
+    results = {}
+    for name, func in (
+        ("OggStream.iter_pages", bench_oggstream),
+        ("OggPageReader.iter_pages", bench_pagereader),
+    ):
+        best = float("inf")
+        pages = 0
+        for _ in range(rounds):
+            stream = open_stream(data, use_pipe)
+            start = time.perf_counter()
+            pages = func(stream)
+            best = min(best, time.perf_counter() - start)
+            stream.close()
+        results[name] = pages / best
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3600.0)
+    parser.add_argument("--page-duration", type=float, default=0.02)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--in-memory",
+        action="store_true",
+        help="read from a BytesIO instead of a pipe",
+    )
+    args = parser.parse_args()
+
+    results = run(args.seconds, args.page_duration, args.rounds, not args.in_memory)
+    baseline = results["OggStream.iter_pages"]
+    for name, pages_per_sec in results.items():
+        ratio = pages_per_sec / baseline
+        print(f"{name:<28} {pages_per_sec:>12,.0f} pages/s  x{ratio:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Stand-in for the two ffmpeg invocations the streaming path makes.
+
+    python -m benchmarks.fake_ffmpeg [-re] -i <path or -> ... pipe:1
+
+With a file input it copies the file to stdout, like the per-track
+`-c:a copy -f opus` process does for an Ogg/Opus source. With `-i -` it acts
+as the master process: the chained Ogg streams written to its stdin come out
+as one logical stream with a single header and continuous granule positions,
+paced to real time when `-re` is given. Every other option is ignored.
+
+`benchmarks.fakes.fake_ffmpeg_on_path` puts this on PATH as `ffmpeg`.
+"""
+
+import shutil
+import struct
+import sys
+import time
+
+from src.utils.opusreader import OggPageReader
+
+from .synthetic import ogg_crc
+
+NO_GRANULE = (1 << 64) - 1
+SERIAL = 0x70796C76
+
+
+def copy_file(path: str):
+    with open(path, "rb") as f:
+        shutil.copyfileobj(f, sys.stdout.buffer, 1 << 16)
+
+
+def remux(realtime: bool):
+    out = sys.stdout.buffer
+    started = time.monotonic()
+    pagenum = 0
+    offset = 0
+    last_granule = 0
+    header_done = False
+    skip_tags = False
+
+    for page in OggPageReader(sys.stdin.buffer).iter_pages():
+        if page.flag & 2:
+            # the start of a new track; keep only the first track's header
+            if header_done:
+                offset = last_granule
+                skip_tags = True
+                continue
+        elif skip_tags:
+            skip_tags = False
+            continue
+        elif not header_done:
+            header_done = True
+
+        granule = page.gran_pos
+        if granule != NO_GRANULE:
+            granule += offset
+            last_granule = granule
+
+        raw = bytearray(bytes(page))
+        # one endless stream: no end-of-stream flags, one serial, one sequence
+        raw[5] &= 0xFB
+        struct.pack_into("<QIII", raw, 6, granule, SERIAL, pagenum, 0)
+        struct.pack_into("<I", raw, 22, ogg_crc(raw))
+        pagenum += 1
+
+        if realtime and granule != NO_GRANULE:
+            delay = started + granule / 48000 - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        out.write(raw)
+        out.flush()
+
+
+def main(argv: list[str]):
+    source = argv[argv.index("-i") + 1]
+    try:
+        if source == "-":
+            remux("-re" in argv)
+        else:
+            copy_file(source)
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
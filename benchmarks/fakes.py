@@ -0,0 +1,113 @@
+"""Offline stand-ins for the network-facing parts of the streaming path.
+
+`install` must run before `main` is imported, since importing it starts the
+default station.
+"""
+
+import os
+import stat
+import sys
+import tempfile
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from .synthetic import make_opus_stream
+
+FAKE_PREFIX = "fake://track/"
+
+
+class FakeExtractor:
+    """Answers extractions with synthetic Ogg/Opus files written to `directory`.
+
+    Tracks are `fake://track/<n>`; their related tracks are the next ones, so
+    the autoqueue keeps cycling through the same few files.
+    """
+
+    def __init__(self, directory: str, tracks: int = 3, seconds: float = 30.0) -> None:
+        self.directory = directory
+        self.tracks = tracks
+        self.seconds = seconds
+        self.calls = 0
+
+        for number in range(tracks):
+            with open(self.path_for(number), "wb") as f:
+                f.write(
+                    make_opus_stream(seconds, page_duration=0.02, serial=number + 1)
+                )
+
+    def path_for(self, number: int) -> str:
+        return os.path.join(self.directory, f"track-{number}.opus")
+
+    @staticmethod
+    def number_of(url: str) -> int:
+        if not url.startswith(FAKE_PREFIX):
+            raise ValueError(f"not a fake track: {url}")
+        return int(url[len(FAKE_PREFIX) :])
+
+    def create(self, url: str, process: bool = True) -> dict:
+        self.calls += 1
+        number = self.number_of(url) % self.tracks
+        return {
+            "id": f"fake{number}",
+            "title": f"Synthetic track {number}",
+            "duration": self.seconds,
+            "extractor": "fake",
+            "webpage_url": f"{FAKE_PREFIX}{number}",
+            "url": self.path_for(number),
+            "process": True,
+        }
+
+    def submit(self, url: str, process: bool = True) -> Future:
+        fut = Future()
+        try:
+            fut.set_result(self.create(url, process))
+        except Exception as err:
+            fut.set_exception(err)
+        return fut
+
+    def related(self, video_id: str) -> list[str]:
+        current = int(video_id[len("fake") :])
+        return [
+            f"{FAKE_PREFIX}{(current + step) % self.tracks}"
+            for step in range(1, self.tracks)
+        ]
+
+
+def install(fake: FakeExtractor):
+    """Route every extraction and recommendation lookup to `fake`."""
+    from src import audio, autoqueue, jobs
+    from src.utils import extractor
+
+    jobs.ExtractionPool.start = lambda self: None  # type: ignore
+    jobs.ExtractionPool.submit = (  # type: ignore
+        lambda self, url, process=True, reserved=False: fake.submit(url, process)
+    )
+    extractor.create = fake.create
+    # start (and fall back) on a fake track, with no state from the checkout
+    autoqueue.FALLBACK_TRACK = f"{FAKE_PREFIX}0"
+    audio.enable_state_store = lambda path: None
+    audio.QueueAudioHandler.experiment_get_related_tracks = (  # type: ignore
+        lambda self, video_id=None: fake.related(video_id or self.now_playing["id"])
+    )
+
+
+@contextmanager
+def fake_ffmpeg_on_path():
+    """Put `benchmarks.fake_ffmpeg` first on PATH as `ffmpeg`."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory(prefix="pylive-ffmpeg-") as directory:
+        shim = os.path.join(directory, "ffmpeg")
+        with open(shim, "w") as f:
+            f.write(
+                "#!/bin/sh\n"
+                f'cd "{root}" && '
+                f'exec "{sys.executable}" -m benchmarks.fake_ffmpeg "$@"\n'
+            )
+        os.chmod(shim, os.stat(shim).st_mode | stat.S_IXUSR)
+
+        saved = os.environ["PATH"]
+        os.environ["PATH"] = directory + os.pathsep + saved
+        try:
+            yield shim
+        finally:
+            os.environ["PATH"] = saved
@@ -0,0 +1,413 @@
+"""Offline load test of the streaming path.
+
+Runs without network access or YouTube: tracks come from a fake extractor
+serving synthetic Ogg/Opus files, and unless `--real-ffmpeg` is given a small
+Python stand-in replaces ffmpeg. Run from the repository root:
+
+    python -m benchmarks.loadtest --clients 50 --output results.json
+    python -m benchmarks.loadtest --compare results.json
+
+Suites:
+
+    parse    pages/s of OggStream and OggPageReader over a pipe
+    fanout   one BroadcastHub feeding N in-process `gen()` consumers
+    routes   N HTTP clients on /stream and N on /watch_event of a live server
+
+The JSON result carries the commit it was measured on; `--compare` prints
+the relative change of every number against an earlier result.
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+from threading import Event, Thread
+from typing import Optional
+
+from src.utils.broadcast import BroadcastHub
+from src.utils.opusreader import OggPageReader
+
+from . import bench_opusreader
+from .fakes import FakeExtractor, fake_ffmpeg_on_path, install
+from .synthetic import iter_opus_pages
+
+NO_GRANULE = (1 << 64) - 1
+
+
+def percentiles(samples: list[float], points=(50, 90, 99)) -> dict[str, float]:
+    if not samples:
+        return {f"p{point}": 0.0 for point in points} | {"max": 0.0}
+
+    ordered = sorted(samples)
+    result = {
+        f"p{point}": ordered[min(len(ordered) - 1, len(ordered) * point // 100)]
+        for point in points
+    }
+    result["max"] = ordered[-1]
+    return result
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # peak rather than current outside Linux; still fine for deltas
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Usage:
+    """CPU time of this process over a measured window."""
+
+    def __enter__(self):
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.cpu = time.process_time() - self.cpu
+        self.wall = time.perf_counter() - self.wall
+
+    def cpu_percent(self) -> float:
+        return 100 * self.cpu / self.wall if self.wall else 0.0
+
+
+def bench_parse(seconds: float) -> dict:
+    results = bench_opusreader.run(seconds, page_duration=0.02, rounds=3)
+    return {
+        "oggstream_pages_per_sec": results["OggStream.iter_pages"],
+        "pagereader_pages_per_sec": results["OggPageReader.iter_pages"],
+    }
+
+
+def bench_fanout(gen, clients: int, seconds: float, page_rate: float) -> dict:
+    """Publish `page_rate` pages/s into a hub read by `clients` `gen()` loops."""
+    pages = iter_opus_pages(seconds * page_rate * 0.02 + 1, page_duration=0.02)
+    hub = BroadcastHub()
+    hub.set_header(next(pages) + next(pages))
+    published: dict[int, float] = {}
+    latencies: list[list[float]] = [[] for _ in range(clients)]
+    received = [0] * clients
+    listeners = [hub.subscribe() for _ in range(clients)]
+
+    def consume(index: int):
+        listener = listeners[index]
+        for chunk in gen(listener):
+            now = time.perf_counter()
+            received[index] += len(chunk)
+            sent = published.get(listener.cursor - 1)
+            if sent is not None:
+                latencies[index].append(now - sent)
+
+    before = rss_bytes()
+    threads = [
+        Thread(target=consume, args=(index,), daemon=True) for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    memory = rss_bytes() - before
+
+    count = 0
+    with Usage() as usage:
+        started = time.perf_counter()
+        for page in pages:
+            due = started + count / page_rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            published[hub.head] = time.perf_counter()
+            hub.publish(page, 0)
+            count += 1
+            if time.perf_counter() - started >= seconds:
+                break
+        hub.close()
+        for thread in threads:
+            thread.join(5)
+
+    dropped = sum(listener.dropped for listener in listeners)
+    all_latencies = [value for values in latencies for value in values]
+    return {
+        "clients": clients,
+        "pages_published": count,
+        "pages_per_sec": count / usage.wall,
+        "delivered_bytes_per_sec": sum(received) / usage.wall,
+        "dropped_pages": dropped,
+        "cpu_percent": usage.cpu_percent(),
+        "cpu_percent_per_listener": usage.cpu_percent() / max(1, clients),
+        "memory_per_listener": memory / max(1, clients),
+        "latency_ms": {
+            key: value * 1000 for key, value in percentiles(all_latencies).items()
+        },
+    }
+
+
+def stream_client(port: int, path: str, seconds: float, results: list):
+    """Read `path` for `seconds`; keep (granule, received) for every page."""
+    connected = time.time()
+    samples: list[tuple[int, float]] = []
+    received = 0
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        for page in OggPageReader(response).iter_pages():  # type: ignore
+            now = time.time()
+            received += len(page)
+            if page.gran_pos != NO_GRANULE:
+                samples.append((page.gran_pos, now))
+            if now - connected >= seconds:
+                break
+        conn.close()
+    except Exception as err:
+        results.append({"error": f"{err.__class__.__name__}: {err}"})
+        return
+    results.append({"connected": connected, "bytes": received, "samples": samples})
+
+
+def event_client(port: int, path: str, seconds: float, results: list):
+    """Read server-sent events for `seconds`; keep the delay of each one."""
+    connected = time.time()
+    delays: list[float] = []
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        while time.time() - connected < seconds:
+            line = response.readline()
+            if not line:
+                break
+            if line.startswith(b"data: ") and b'"sent"' in line:
+                delays.append(time.time() - json.loads(line[6:])["sent"])
+        conn.close()
+    except Exception as err:
+        results.append({"error": f"{err.__class__.__name__}: {err}"})
+        return
+    results.append({"connected": connected, "delays": delays})
+
+
+def run_clients(port: int, clients: int, seconds: float, stream_path: str, queue):
+    """Client side of the routes suite; runs in its own process."""
+    streams: list = []
+    events: list = []
+    threads = [
+        Thread(target=stream_client, args=(port, stream_path, seconds, streams))
+        for _ in range(clients)
+    ] + [
+        Thread(target=event_client, args=(port, "/watch_event", seconds, events))
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.put((streams, events))
+
+
+def bench_routes(
+    main, clients: int, seconds: float, bitrate: Optional[int] = None
+) -> dict:
+    from werkzeug.serving import make_server
+
+    station = main.stations.get(main.DEFAULT_STATION)
+    if not station.hub.header_ready.wait(30):
+        raise RuntimeError("the station never produced a stream header")
+
+    # granule -> when it was published, to time delivery end to end
+    published: dict[int, float] = {}
+    hub_publish = station.hub.publish
+
+    def publish(page: bytes, granule: int = -1):
+        published[granule] = time.time()
+        hub_publish(page, granule)
+
+    station.hub.publish = publish
+
+    server = make_server("127.0.0.1", 0, main.app, threaded=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    stop = Event()
+
+    def send_events():
+        # a steady trickle of events, stamped so clients can time them
+        while not stop.wait(0.05):
+            station.event_queue.add_event("benchmark", {"sent": time.time()})
+
+    stream_path = "/stream" + (f"?bitrate={bitrate}" if bitrate else "")
+    try:
+        with Usage() as idle:
+            time.sleep(min(seconds, 5.0))
+
+        Thread(target=send_events, daemon=True).start()
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(
+            target=run_clients, args=(server.port, clients, seconds, stream_path, queue)
+        )
+        before = rss_bytes()
+        with Usage() as loaded:
+            process.start()
+            streams, events = queue.get(timeout=seconds + 60)
+            process.join()
+        memory = rss_bytes() - before
+    finally:
+        stop.set()
+        server.shutdown()
+        station.hub.publish = hub_publish
+
+    errors = [r["error"] for r in streams + events if "error" in r]
+    stream_delays = [
+        now - published[granule]
+        for result in streams
+        if "samples" in result
+        for granule, now in result["samples"]
+        if published.get(granule, 0) >= result["connected"]
+    ]
+    event_delays = [delay for r in events for delay in r.get("delays", ())]
+    extra_cpu = loaded.cpu_percent() - idle.cpu_percent()
+    connected = max(1, len(streams) + len(events) - len(errors))
+
+    return {
+        "clients": clients,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "idle_cpu_percent": idle.cpu_percent(),
+        "cpu_percent": loaded.cpu_percent(),
+        "cpu_percent_per_client": extra_cpu / connected,
+        "memory_per_client": memory / connected,
+        "stream": {
+            "bytes_per_sec_per_client": sum(r.get("bytes", 0) for r in streams)
+            / max(1, len(streams))
+            / seconds,
+            "latency_ms": {
+                key: value * 1000 for key, value in percentiles(stream_delays).items()
+            },
+        },
+        "watch_event": {
+            "events_received": len(event_delays),
+            "latency_ms": {
+                key: value * 1000 for key, value in percentiles(event_delays).items()
+            },
+        },
+    }
+
+
+def git_revision() -> dict:
+    def git(*args) -> str:
+        try:
+            return subprocess.run(
+                ["git", *args], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain")),
+    }
+
+
+def flatten(data: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(previous: dict, current: dict):
+    before = flatten(previous.get("results", {}))
+    after = flatten(current.get("results", {}))
+    commits = previous["meta"]["commit"][:10], current["meta"]["commit"][:10]
+    print(f"{'':<56} {commits[0]:>12} {commits[1]:>12}")
+    for key, value in after.items():
+        old = before.get(key)
+        if old is None:
+            print(f"{key:<56} {'-':>12} {value:>12.4g}")
+            continue
+        change = f"{(value - old) / old * 100:+.1f}%" if old else ""
+        print(f"{key:<56} {old:>12.4g} {value:>12.4g} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument(
+        "--suites", default="parse,fanout,routes", help="comma separated"
+    )
+    parser.add_argument(
+        "--page-rate",
+        type=float,
+        default=250.0,
+        help="pages/s published by the fanout suite",
+    )
+    parser.add_argument("--bitrate", type=int, help="stream a rendition instead")
+    parser.add_argument("--real-ffmpeg", action="store_true")
+    parser.add_argument("--output", help="write the JSON result here")
+    parser.add_argument("--compare", help="an earlier JSON result to compare with")
+    args = parser.parse_args()
+    suites = set(args.suites.split(","))
+
+    result = {
+        "meta": {
+            **git_revision(),
+            "time": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+    results = result["results"]
+
+    if "parse" in suites:
+        print("parse...", file=sys.stderr)
+        results["parse"] = bench_parse(600.0)
+
+    if suites & {"fanout", "routes"}:
+        with tempfile.TemporaryDirectory(prefix="pylive-tracks-") as directory:
+            install(FakeExtractor(directory))
+            with nullcontext() if args.real_ffmpeg else fake_ffmpeg_on_path():
+                # importing main starts the default station
+                import main as app_main
+
+                if "fanout" in suites:
+                    print("fanout...", file=sys.stderr)
+                    results["fanout"] = bench_fanout(
+                        app_main.gen, args.clients, args.seconds, args.page_rate
+                    )
+                if "routes" in suites:
+                    print("routes...", file=sys.stderr)
+                    results["routes"] = bench_routes(
+                        app_main, args.clients, args.seconds, args.bitrate
+                    )
+
+                for station in app_main.stations:
+                    station.close()
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+    elif not args.output:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
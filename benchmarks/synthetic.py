@@ -0,0 +1,81 @@
+"""Synthetic Ogg/Opus streams for benchmarks that must not touch the network."""
+
+import struct
+from typing import Generator
+
+OPUS_HEAD = b"OpusHead" + struct.pack("<BBHIhB", 1, 2, 312, 48000, 0, 0)
+OPUS_TAGS = b"OpusTags" + struct.pack("<I", 6) + b"pylive" + struct.pack("<I", 0)
+
+# one 20 ms Opus frame at 48 kHz
+FRAME_SAMPLES = 960
+
+
+def _crc_table() -> list[int]:
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else (crc << 1)
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def ogg_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+def make_page(
+    packets: list[bytes], granule: int, pagenum: int, flag: int = 0, serial: int = 1
+) -> bytes:
+    segtable = bytearray()
+    for packet in packets:
+        size = len(packet)
+        while size >= 255:
+            segtable.append(255)
+            size -= 255
+        segtable.append(size)
+
+    header = struct.pack(
+        "<4sBBqIIIB", b"OggS", 0, flag, granule, serial, pagenum, 0, len(segtable)
+    )
+    page = bytearray(header + segtable + b"".join(packets))
+    struct.pack_into("<I", page, 22, ogg_crc(page))
+    return bytes(page)
+
+
+def iter_opus_pages(
+    seconds: float,
+    bitrate: int = 152_000,
+    page_duration: float = 1.0,
+    serial: int = 1,
+) -> Generator[bytes, None, None]:
+    """Yield the header pages and then `seconds` of fake audio pages."""
+    yield make_page([OPUS_HEAD], 0, 0, flag=2, serial=serial)
+    yield make_page([OPUS_TAGS], 0, 1, serial=serial)
+
+    frame = bytes(
+        (i * 7) & 0xFF for i in range(max(1, bitrate * FRAME_SAMPLES // 48000 // 8))
+    )
+    frames_per_page = max(1, int(page_duration * 48000 / FRAME_SAMPLES))
+    total_frames = int(seconds * 48000 / FRAME_SAMPLES)
+
+    pagenum = 2
+    granule = 0
+    for offset in range(0, total_frames, frames_per_page):
+        count = min(frames_per_page, total_frames - offset)
+        granule += count * FRAME_SAMPLES
+        last = offset + count >= total_frames
+        yield make_page(
+            [frame] * count, granule, pagenum, flag=4 if last else 0, serial=serial
+        )
+        pagenum += 1
+
+
+def make_opus_stream(seconds: float, **kwargs) -> bytes:
+    return b"".join(iter_opus_pages(seconds, **kwargs))
@@ -1,47 +1,80 @@
-from flask import Flask, Response, jsonify, render_template, request
+import socket
+import sys
+from concurrent.futures.process import BrokenProcessPool
 
+from flask import Flask, Response, g, jsonify, render_template, request
+from werkzeug.serving import WSGIRequestHandler
+
+from src import audio as audio_module
 from src.audio import QueueAudioHandler
-from src.utils.general import URLRequest, run_in_thread
+from src.jobs import extraction_pool, import_pool, job_manager
+from src.loudness import analyzer as loudness
+from src.segmenter import SEGMENT_DURATION, SEGMENT_WINDOW
+from src.station import DEFAULT_STATION, StationManager
+from src.utils.broadcast import Listener
+from src.utils import extractor
+from src.utils.errors import ExecutorQueueFullException, ExtractionQueueFullException
+from src.utils.executors import cpu_pool, io_pool, shutdown_pools
+from src.utils.metrics import (
+    LISTENER_BYTES,
+    LISTENER_EVICTIONS,
+    LISTENER_SKIPS,
+    REGISTRY,
+)
+from src.webhook import WebhookDispatcher
 import json
 
 WEBHOOK_URL = None
+# seconds of already-played audio sent to a new listener in its first write
+PREBUFFER_SECONDS = 3.0
+# seconds a /stream listener may fall behind before it is skipped ahead to
+# PREBUFFER_SECONDS behind the live edge
+LAG_BUDGET_SECONDS = 10.0
+# seconds a listener may stay behind, despite being skipped ahead, before it
+# is disconnected
+EVICT_AFTER_SECONDS = 30.0
+# seconds one socket write may block before the client is disconnected
+WRITE_TIMEOUT = 20.0
+# sqlite file that keeps extracted metadata, stream urls and loudness analyses
+# across restarts, e.g. sys.path[0] + "/.cache.db"
+EXTRACTOR_CACHE_PATH = None
+# directory that keeps played tracks so replays skip the network
+AUDIO_CACHE_DIR = None
+AUDIO_CACHE_MAX_BYTES = 2 << 30
+# sqlite file that keeps every station's queues and history across restarts
+STATE_DB_PATH = sys.path[0] + "/.state.db"
+# entries per /queue page
+QUEUE_PAGE_SIZE = 5
 app = Flask(__name__, static_url_path="/static")
 # prev_add = None
 
-# audio streaming
-audio = QueueAudioHandler()
+# fork the extraction workers before anything below starts a thread or opens
+# a database: a child forked while another thread holds a lock can deadlock
+extraction_pool.start()
 
+if EXTRACTOR_CACHE_PATH:
+    cache_db = extractor.enable_cache_persistence(EXTRACTOR_CACHE_PATH)
+    loudness.cache.attach(cache_db)
 
-def send_webhook(func):
-    def webhook(response: Response, webhook_url=None, func_name=""):
-        if not webhook_url:
-            return
-
-        res = URLRequest.request(
-            webhook_url,
-            method="POST",
-            data={
-                "content": f"`/{func_name}`\n```{json.dumps(response.json, indent=2)}\n```",
-                "username": "debug radio",
-            },
-            headers={
-                "Content-Type": "application/json",
-            },
-        )
+if AUDIO_CACHE_DIR:
+    audio_module.enable_audio_cache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES)
+
+if STATE_DB_PATH:
+    audio_module.enable_state_store(STATE_DB_PATH)
 
-        if res.getcode() != 204:
-            print("Failed to send webhook")
-            print(res.read().decode("utf-8"))
+webhooks = WebhookDispatcher(WEBHOOK_URL) if WEBHOOK_URL else None
 
+# audio streaming
+stations = StationManager()
+stations.get(DEFAULT_STATION, create=True)
+
+
+def send_webhook(func):
     def wrapper(*args, **kwargs):
         ret = func(*args, **kwargs)
-        run_in_thread(
-            webhook,
-            wait_for_result=False,
-            response=ret[0],
-            func_name=func.__name__,
-            webhook_url=WEBHOOK_URL,
-        )
+        if webhooks:
+            # only queues the event; delivery happens on the webhook thread
+            webhooks.post(func.__name__, {"station": g.station_name, **ret[0].json})
         return ret
 
     wrapper.__name__ = func.__name__
@@ -55,13 +88,9 @@ def check_empty(arg) -> bool:
     return any(arg) and (len(arg) != 0)
 
 
-def make_response(
-    data=None,
-    msg: str = "success",
-    is_error: bool = False,
-    status_code: int = 200,
-    other_data=None,
-) -> tuple[Response, int]:
+def build_response(
+    data=None, msg: str = "success", is_error: bool = False, other_data=None
+) -> dict:
     build_resp = {
         "msg": msg,
         "error": is_error,
@@ -71,23 +100,111 @@ def make_response(
     if other_data:
         build_resp.update({"other_data": other_data})
 
-    return jsonify(build_resp), status_code
+    return build_resp
+
+
+def make_response(
+    data=None,
+    msg: str = "success",
+    is_error: bool = False,
+    status_code: int = 200,
+    other_data=None,
+) -> tuple[Response, int]:
+    return jsonify(build_response(data, msg, is_error, other_data)), status_code
+
+
+def snapshot_response(
+    name: str, version, build, content_type: str = "application/json"
+) -> Response:
+    """Serve the cached snapshot `name` of the station, or 304 if unchanged.
+
+    `build` only runs when `version` moved since the snapshot was cached.
+    """
+    audio: QueueAudioHandler = g.audio
+    etag, body = audio.snapshots.get(name, version, build)
+    response = Response(
+        body, content_type=content_type, headers={"Cache-Control": "no-cache"}
+    )
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def dump_response(**kwargs) -> bytes:
+    return json.dumps(build_response(**kwargs)).encode("utf-8")
 
 
 def make_error(*args, **kwargs):
     return make_response(*args, is_error=True, **kwargs)
 
 
-def gen(audio: QueueAudioHandler):
-    yield audio.wait_for_header()
-    while audio.audio_thread.is_alive():
-        yield audio.buffer
-        audio.event.wait()
-    return
+def station_route(rule: str):
+    """Serve `rule` for the default station and as /<station>`rule` for the rest."""
 
+    def decorator(func):
+        app.add_url_rule(rule, view_func=func)
+        app.add_url_rule("/<station>" + rule, view_func=func)
+        return func
 
-@app.route("/add")
+    return decorator
+
+
+@app.url_value_preprocessor
+def pull_station(endpoint, values):
+    g.station_name = (values or {}).pop("station", DEFAULT_STATION)
+
+
+@app.before_request
+def load_station():
+    if request.endpoint in (None, "static"):
+        return
+
+    # only these start a station that does not run yet; reads never do
+    create = request.endpoint in ("add", "create_station")
+    g.audio = stations.get(g.station_name, create=create)
+    # for the request handler, which only sees the WSGI environ
+    request.environ["pylive.station"] = g.station_name
+    if g.audio is None:
+        return make_error(msg="No such station.", status_code=404)
+
+
+def gen(listener: Listener, station: str = DEFAULT_STATION):
+    try:
+        chunk = listener.hub.wait_for_header() + listener.pending()
+        # every listener thread bumps the same series, so take the lock
+        LISTENER_BYTES.inc(len(chunk), station=station)
+        yield chunk
+        for chunk in listener:
+            LISTENER_BYTES.inc(len(chunk), station=station)
+            yield chunk
+    finally:
+        listener.close()
+        if listener.skips:
+            LISTENER_SKIPS.inc(listener.skips, station=station)
+        if listener.evicted:
+            LISTENER_EVICTIONS.inc(station=station, reason="lag")
+            print(f"{station}: dropped listener {listener.id}, too far behind")
+
+
+class RequestHandler(WSGIRequestHandler):
+    # applies to every socket operation, so a client that stops reading ends
+    # its stream instead of holding a thread on a blocked write forever
+    timeout = WRITE_TIMEOUT
+
+    def connection_dropped(self, error, environ=None):
+        if isinstance(error, socket.timeout):
+            station = (environ or {}).get("pylive.station", DEFAULT_STATION)
+            LISTENER_EVICTIONS.inc(station=station, reason="write_timeout")
+
+
+@app.route("/<station>/create")
+def create_station():
+    return make_response(data={"station": g.audio.name})
+
+
+@station_route("/add")
+@send_webhook
 def add():
+    audio: QueueAudioHandler = g.audio
     # global prev_add
     # if prev_add == request.remote_addr:
     #     return make_error(msg="Calm down you just use this.", status_code=429)
@@ -96,67 +213,272 @@ def add():
     if not url:
         return make_error(msg="missing `url` argument")
 
+    as_playlist = request.args.get("playlist", "0") == "1"
     try:
-        audio.add(url)
+        if as_playlist or extractor.is_playlist_url(url):
+            job = audio.import_playlist(url)
+        else:
+            job = audio.add(url)
+    except (ExtractionQueueFullException, ExecutorQueueFullException):
+        return make_error(msg="Too many pending extractions.", status_code=429)
+    except BrokenProcessPool:
+        return make_error(msg="Extraction is unavailable.", status_code=503)
     except Exception as err:
         return make_error(msg=f"{err.__class__.__name__}: {str(err)}")
 
     # prev_add = request.remote_addr
-    return make_response()
+    return make_response(data=job, status_code=202)
+
 
+@app.route("/jobs")
+def get_jobs():
+    return make_response(
+        data=extraction_pool.stats(),
+        other_data={
+            "io": io_pool.stats(),
+            "cpu": cpu_pool.stats(),
+            "import": import_pool.stats(),
+        },
+    )
 
-@app.route("/queue")
+
+@app.route("/jobs/<job_id>")
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return make_error(msg="job not found", status_code=404)
+
+    return make_response(data=job)
+
+
+@station_route("/queue")
 def get_queue():
-    index = int(request.args.get("index") or request.args.get("page", 0)) + 1
+    audio: QueueAudioHandler = g.audio
+    page = get_int_arg("index")
+    if page is None:
+        page = get_int_arg("page") or 0
+    page = max(page, 0)
     use_autoqueue = request.args.get("use_autoqueue", "0") == "1"
 
-    end_offset = max(index * 5, len(audio.queue))
-    start_offset = max(end_offset - 5, 0)
+    def build():
+        start_offset = page * QUEUE_PAGE_SIZE
+        data = {
+            "queue": audio.queue.page(start_offset, start_offset + QUEUE_PAGE_SIZE),
+        }
 
-    data = {
-        "queue": audio.queue[start_offset:end_offset],
-    }
+        if use_autoqueue and audio.auto_queue:
+            data.update({"auto_queue": audio.auto_queue.snapshot()})
 
-    if use_autoqueue and audio.auto_queue:
-        data.update({"auto_queue": audio.auto_queue})
+        return dump_response(data=data)
+
+    version = (
+        audio.queue.version,
+        audio.auto_queue.version if use_autoqueue else None,
+    )
+    return snapshot_response(f"queue:{page}:{use_autoqueue:d}", version, build)
+
+
+def get_int_arg(name="id"):
+    try:
+        return int(request.args.get(name, ""))
+    except ValueError:
+        return None
+
+
+@station_route("/queue/remove")
+def queue_remove():
+    audio: QueueAudioHandler = g.audio
+    qid = get_int_arg()
+    if qid is None:
+        return make_error(msg="missing `id` argument")
+
+    if not audio.remove(qid):
+        return make_error(msg="entry not found", status_code=404)
+
+    return make_response()
+
+
+@station_route("/queue/move")
+def queue_move():
+    audio: QueueAudioHandler = g.audio
+    qid, index = get_int_arg(), get_int_arg("to")
+    if qid is None or index is None:
+        return make_error(msg="missing `id` or `to` argument")
+
+    if not audio.move(qid, index):
+        return make_error(msg="entry not found", status_code=404)
+
+    return make_response()
 
-    return make_response(data=data)
+
+@station_route("/queue/clear")
+def queue_clear():
+    audio: QueueAudioHandler = g.audio
+    audio.clear()
+    return make_response()
 
 
-@app.route("/np")
-@app.route("/nowplaying")
+@station_route("/np")
+@station_route("/nowplaying")
 def get_nowplaying():
-    data: dict = {"now_playing": audio.now_playing}
+    audio: QueueAudioHandler = g.audio
+
+    def build():
+        data: dict = {"now_playing": audio.now_playing}
+
+        next_up = audio.queue.snapshot()[:1]
+        if next_up:
+            data.update({"next_up": next_up[0]})
+
+        return dump_response(
+            data=data, other_data={"transition_gap": audio.last_transition_gap}
+        )
+
+    return snapshot_response("np", (audio.state_version, audio.queue.version), build)
+
 
-    if audio.queue:
-        data.update({"next_up": audio.queue[0]})
+@app.route("/cache")
+def get_cache():
+    data: dict = {"extractor": extractor.cache.stats()}
+
+    if audio_module.audio_cache:
+        data.update({"audio": audio_module.audio_cache.stats()})
 
     return make_response(data=data)
 
 
-@app.route("/skip")
+@app.route("/metrics")
+def get_metrics():
+    return Response(REGISTRY.render(), content_type="text/plain; version=0.0.4")
+
+
+@station_route("/skip")
+@send_webhook
 def skip():
+    audio: QueueAudioHandler = g.audio
     audio._skip = True
     return make_response()
 
 
-@app.route("/stream")
+@station_route("/stream")
 def get_stream():
+    audio: QueueAudioHandler = g.audio
     if not audio.ffmpeg:
         return make_response(msg="No stream avaliable.", is_error=True, status_code=404)
 
-    return Response(gen(audio), content_type="audio/ogg", status=200)
-
+    bitrate = get_int_arg("bitrate")
+    if bitrate is None:
+        source = audio.hub
+    elif bitrate in audio.renditions:
+        source = audio.renditions[bitrate]
+    else:
+        return make_error(
+            msg="unsupported `bitrate`",
+            other_data={"bitrates": list(audio.renditions)},
+        )
 
-@app.route("/")
+    listener = source.subscribe(
+        backlog=PREBUFFER_SECONDS,
+        lag_budget=LAG_BUDGET_SECONDS,
+        evict_after=EVICT_AFTER_SECONDS,
+    )
+    return Response(gen(listener, audio.name), content_type="audio/ogg", status=200)
+
+
+@station_route("/waveform")
+def get_waveform():
+    # binary peak/RMS frames for the visualizer; see `src.waveform`
+    audio: QueueAudioHandler = g.audio
+    if not audio.ffmpeg or not audio.waveform.available:
+        return make_error(msg="No waveform avaliable.", status_code=404)
+
+    listener = audio.waveform.subscribe(backlog=PREBUFFER_SECONDS)
+    return Response(
+        gen(listener, audio.name),
+        content_type="application/octet-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@station_route("/hls/live.m3u8")
+def get_hls_playlist():
+    audio: QueueAudioHandler = g.audio
+    audio.segmenter.touch()
+    return Response(
+        audio.segmenter.playlist(),
+        content_type="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": f"public, max-age={int(SEGMENT_DURATION // 2)}"},
+    )
+
+
+@station_route("/hls/<int:sequence>.ogg")
+def get_hls_segment(sequence: int):
+    audio: QueueAudioHandler = g.audio
+    audio.segmenter.touch()
+
+    segment = audio.segmenter.segment(sequence)
+    if segment is None:
+        return make_error(msg="segment not found", status_code=404)
+
+    return Response(
+        segment,
+        content_type="audio/ogg",
+        headers={
+            "Cache-Control": f"public, max-age={int(SEGMENT_DURATION * SEGMENT_WINDOW)}"
+            ", immutable"
+        },
+    )
+
+
+@station_route("/")
 def index():
-    return render_template("stream.html", np=audio.now_playing, queue=audio.queue)
+    audio: QueueAudioHandler = g.audio
+    base = "" if audio.name == DEFAULT_STATION else f"/{audio.name}"
+
+    def build():
+        return render_template(
+            "stream.html", np=audio.now_playing, queue=audio.queue.snapshot(), base=base
+        ).encode("utf-8")
+
+    return snapshot_response(
+        "index",
+        (audio.state_version, audio.queue.version),
+        build,
+        content_type="text/html; charset=utf-8",
+    )
 
 
-@app.route("/watch_event")
+@station_route("/watch_event")
 def watch_event():
-    return Response(audio.event_queue.watch(), content_type="text/event-stream")
+    audio: QueueAudioHandler = g.audio
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get(
+        "last_event_id"
+    )
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    return Response(
+        audio.event_queue.watch(last_event_id),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# no station may be named like the first path segment of a global route
+stations.reserve(
+    rule.rule.split("/")[1]
+    for rule in app.url_map.iter_rules()
+    if not rule.rule.startswith("/<")
+)
 
 
 if __name__ == "__main__":
-    app.run("0.0.0.0", port=5000, threaded=True)
+    try:
+        app.run("0.0.0.0", port=5000, threaded=True, request_handler=RequestHandler)
+    finally:
+        # let running tasks (playlist imports, ...) finish, drop queued ones
+        shutdown_pools()
+        if audio_module.state_store:
+            audio_module.state_store.close()
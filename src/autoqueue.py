@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Callable, Optional, Union
+
+from src.utils import extractor
+from src.utils.cache import ExtractorCache, LRUCache
+
+if TYPE_CHECKING:
+    from src.audio import QueueAudioHandler
+
+__all__ = ("AutoQueueFiller", "entry_keys")
+
+# start looking up related tracks once the user queue is shorter than this
+REFILL_THRESHOLD = 2
+# entries the autoqueue is topped up to
+AUTOQUEUE_TARGET = 5
+# recently played tracks that are only suggested again as a last resort
+HISTORY_SIZE = 100
+# seconds the related tracks of one seed stay cached
+RELATED_TTL = 6 * 3600.0
+# played when there is nothing else at all
+FALLBACK_TRACK = "https://music.youtube.com/watch?v=cUuQ5L6Obu4"
+
+
+def entry_keys(entry: Union[str, dict]) -> set[str]:
+    """Every key a queue entry or suggestion may be known by."""
+    if isinstance(entry, str):
+        return {extractor.cache.key_for(entry) or entry}
+
+    keys = set()
+    if entry.get("id"):
+        keys.add(ExtractorCache.make_key(entry))
+    url = entry.get("webpage_url")
+    if url:
+        keys.add(extractor.cache.key_for(url) or url)
+    return keys
+
+
+class AutoQueueFiller:
+    """Keeps the autoqueue topped up in the background.
+
+    Once the user queue runs short, the related tracks of the track that will
+    play last before the autoqueue takes over are looked up, cached per seed
+    and filtered against what played recently, so `pop()` never waits on a
+    recommendation lookup. A new seed from the user queue replaces the
+    autoqueue; while the autoqueue itself is playing it is only extended.
+    """
+
+    def __init__(
+        self,
+        handler: "QueueAudioHandler",
+        lookup: Callable[[str], list],
+        threshold: int = REFILL_THRESHOLD,
+        target: int = AUTOQUEUE_TARGET,
+        history_size: int = HISTORY_SIZE,
+    ) -> None:
+        self.handler = handler
+        self._lookup = lookup
+        self.threshold = threshold
+        self.target = target
+        self.history_size = history_size
+
+        self.lock = Lock()
+        self.related = LRUCache("related", 256, RELATED_TTL)
+        self.history: OrderedDict[str, None] = OrderedDict()
+        # key of the track the autoqueue was built from
+        self.seed: Optional[str] = None
+        self.playing_auto = False
+        self._wake = Event()
+
+        self.thread = Thread(target=self.run, name="autoqueue", daemon=True)
+        self.thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _remember(self, entry: Union[str, dict]):
+        for key in entry_keys(entry):
+            self.history[key] = None
+            self.history.move_to_end(key)
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+
+    def took(self, entry: Union[str, dict], auto: bool):
+        """Note that `entry` was taken for playback from the (auto)queue."""
+        with self.lock:
+            self.playing_auto = auto
+            self._remember(entry)
+        self.wake()
+
+    def restore(self, history: list, seed: Optional[str], playing_auto: bool):
+        """Pick up where a previous run left off; `history` is oldest first."""
+        with self.lock:
+            for entry in history[-self.history_size :]:
+                self._remember(entry)
+            self.seed = seed
+            self.playing_auto = playing_auto
+
+    def _seed(self) -> tuple[Optional[dict], bool]:
+        """The track to base suggestions on, and whether it replaces the autoqueue."""
+        for entry in reversed(self.handler.queue.peek(len(self.handler.queue))):
+            if isinstance(entry, dict) and entry.get("id"):
+                return entry, True
+
+        now_playing = self.handler.now_playing
+        if not now_playing or not now_playing.get("id"):
+            return None, False
+        return now_playing, not self.playing_auto
+
+    def lookup(self, seed: dict) -> list:
+        key = ExtractorCache.make_key(seed)
+        related = self.related.get(key)
+        if related is None:
+            related = self._lookup(seed["id"])
+            if related:
+                self.related.put(key, related)
+        return related or []
+
+    def _step(self):
+        queue, auto_queue = self.handler.queue, self.handler.auto_queue
+        if len(queue) >= self.threshold:
+            return
+
+        seed, replace = self._seed()
+        if seed is None:
+            if not queue and not auto_queue:
+                auto_queue.push(FALLBACK_TRACK)
+            return
+
+        key = ExtractorCache.make_key(seed)
+        replace = replace and key != self.seed
+        if not replace and len(auto_queue) >= self.target:
+            return
+
+        with self.lock:
+            history = list(self.history)
+        exclude = set(history)
+        for entry in queue.peek(len(queue)):
+            exclude |= entry_keys(entry)
+        exclude |= entry_keys(seed)
+        if not replace:
+            for entry in auto_queue.peek(len(auto_queue)):
+                exclude |= entry_keys(entry)
+
+        related = self.lookup(seed)
+        suggestions = []
+        for url in related:
+            keys = entry_keys(url)
+            if keys & exclude:
+                continue
+            exclude |= keys
+            suggestions.append(url)
+
+        if not suggestions and related and (replace or not auto_queue):
+            # everything was played lately; repeat the one played longest ago
+            age = {key: index for index, key in enumerate(history)}
+            replay = [url for url in related if not entry_keys(url) & entry_keys(seed)]
+            replay.sort(key=lambda url: min(age.get(k, -1) for k in entry_keys(url)))
+            suggestions = replay[:1]
+
+        room = self.target - (0 if replace else len(auto_queue))
+        suggestions = suggestions[: max(0, room)]
+        if replace:
+            auto_queue.clear()
+        auto_queue.extend(suggestions)
+        self.seed = key
+
+        if not queue and not auto_queue:
+            auto_queue.push(FALLBACK_TRACK)
+        self.handler.prefetcher.wake()
+
+    def run(self):
+        while not self.handler.closed.is_set():
+            self._wake.wait(5.0)
+            self._wake.clear()
+            try:
+                self._step()
+            except Exception as err:
+                print("autoqueue error")
+                print(err.__class__.__name__, str(err))
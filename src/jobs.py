@@ -0,0 +1,328 @@
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count
+from threading import Lock
+from time import monotonic, sleep, time
+from typing import Callable, Optional
+
+from src.utils import extractor
+from src.utils.errors import (
+    ExecutorQueueFullException,
+    ExtractionQueueFullException,
+    VideoIsOverLengthException,
+)
+from src.utils.executors import TaskPool
+from src.utils.metrics import EXTRACT_SECONDS
+
+__all__ = (
+    "ExtractionPool",
+    "JobManager",
+    "PlaylistImport",
+    "extraction_pool",
+    "import_pool",
+    "job_manager",
+)
+
+# extraction worker processes, each with its own long-lived YoutubeDL
+MAX_WORKERS = 2
+# extractions allowed in flight (running + waiting) before submit refuses more
+MAX_PENDING = 32
+# further in-flight extractions only playback (the track about to start, the
+# prefetcher, the autoqueue) may use, so /add and imports cannot starve it
+RESERVED_PENDING = 8
+# playlist entries fetched per page and resolved at once during an import
+IMPORT_PAGE_SIZE = 50
+IMPORT_CONCURRENCY = 4
+# playlist imports running at once, and waiting for a turn; an import runs for
+# minutes, so it gets a pool of its own instead of holding an io_pool worker
+MAX_IMPORTS = 2
+IMPORT_QUEUE = 16
+
+
+class ExtractionPool:
+    """Runs `extractor.create` in worker processes so it never holds our GIL.
+
+    The workers are forked once, before any thread runs. A pool broken by a
+    dying worker is not forked again, since by then threads hold locks the
+    child would inherit; every call raises BrokenProcessPool until the
+    process is restarted (queues come back from the state store).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        max_pending: int = MAX_PENDING,
+        reserved: int = RESERVED_PENDING,
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.reserved = reserved
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.lock = Lock()
+        self.pending = 0
+        self.broken = False
+
+    def start(self):
+        """Fork the workers now, before the audio threads exist."""
+        with self.lock:
+            if self.executor or self.broken:
+                return
+            self.executor = ProcessPoolExecutor(
+                self.max_workers, initializer=extractor.init_worker
+            )
+            for _ in range(self.max_workers):
+                self.executor.submit(os.getpid)
+
+    @property
+    def queue_depth(self) -> int:
+        """Extractions waiting for a free worker."""
+        return max(0, self.pending - self.max_workers)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "queue_depth": self.queue_depth,
+            "max_pending": self.max_pending,
+            "reserved": self.reserved,
+            "broken": self.broken,
+        }
+
+    def _broke(self):
+        if not self.broken:
+            print("extraction workers died; restart the process to extract again")
+        self.broken = True
+        self.executor = None
+
+    def _finish(self, fut: Future):
+        with self.lock:
+            self.pending -= 1
+            if isinstance(fut.exception(), BrokenProcessPool):
+                self._broke()
+
+    def call(self, fn: Callable, *args, reserved: bool = False) -> Future:
+        """Run a picklable `fn` in a worker process, counting it as pending.
+
+        `reserved` calls may also use the capacity held back for playback.
+        """
+        self.start()
+        limit = self.max_pending + (self.reserved if reserved else 0)
+        with self.lock:
+            # `_finish` may drop the executor from another thread
+            executor = self.executor
+            if executor is None:
+                raise BrokenProcessPool("extraction workers died")
+            if self.pending >= limit:
+                raise ExtractionQueueFullException
+            self.pending += 1
+
+        try:
+            fut = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            with self.lock:
+                self.pending -= 1
+                self._broke()
+            raise
+
+        fut.add_done_callback(self._finish)
+        return fut
+
+    def submit(self, url: str, process: bool = True, reserved: bool = False) -> Future:
+        cached = extractor.cache.get(url, process)
+        if cached:
+            fut = Future()
+            fut.set_result(cached)
+            return fut
+
+        started = monotonic()
+
+        def store(fut: Future):
+            EXTRACT_SECONDS.observe(monotonic() - started, process=process)
+            if fut.exception() is None:
+                extractor.cache.put(url, fut.result())
+
+        fut = self.call(extractor.worker_create, url, process, reserved=reserved)
+        fut.add_done_callback(store)
+        return fut
+
+    def create(self, url: str, process: bool = True, reserved: bool = False) -> dict:
+        """Blocking `extractor.create` that runs in a worker process."""
+        return self.submit(url, process, reserved).result()
+
+
+class JobManager:
+    """Tracks asynchronous extractions started from HTTP requests."""
+
+    def __init__(self, pool: ExtractionPool, retention: int = 256) -> None:
+        self.pool = pool
+        self.retention = retention
+        self.jobs: OrderedDict[str, dict] = OrderedDict()
+        self._ids = count(1)
+        self.lock = Lock()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.jobs.get(job_id)
+
+    def new_job(self, url: str, kind: str = "track") -> dict:
+        job = {
+            "id": f"{next(self._ids):x}",
+            "kind": kind,
+            "url": url,
+            "status": "pending",
+            "created": time(),
+        }
+        with self.lock:
+            self.jobs[job["id"]] = job
+            while len(self.jobs) > self.retention:
+                self.jobs.popitem(last=False)
+        return job
+
+    def discard(self, job: dict):
+        with self.lock:
+            self.jobs.pop(job["id"], None)
+
+    @staticmethod
+    def fail(job: dict, err: BaseException):
+        job.update({"status": "failed", "error": f"{err.__class__.__name__}: {err}"})
+
+    def submit(
+        self,
+        url: str,
+        on_done: Callable[[dict, dict], None],
+        on_error: Callable[[dict, BaseException], None],
+        process: bool = False,
+    ) -> dict:
+        """Start extracting `url`; the callbacks get the job and the result."""
+        job = self.new_job(url)
+
+        def done(fut: Future):
+            err = fut.exception()
+            if err is not None:
+                self.fail(job, err)
+                on_error(job, err)
+                return
+
+            job["status"] = "done"
+            on_done(job, fut.result())
+
+        try:
+            self.pool.submit(url, process).add_done_callback(done)
+        except Exception:
+            self.discard(job)
+            raise
+        return job
+
+
+class PlaylistImport:
+    """Pages through a playlist and resolves its entries in the extraction pool.
+
+    At most `concurrency` entries are resolved at once. Resolved tracks are
+    handed to `on_track` in playlist order as soon as every entry before them
+    is settled, so the first tracks can play while the rest is still importing.
+    """
+
+    def __init__(
+        self,
+        pool: ExtractionPool,
+        job: dict,
+        on_track: Callable[[dict], None],
+        on_progress: Callable[[dict], None],
+        page_size: int = IMPORT_PAGE_SIZE,
+        concurrency: int = IMPORT_CONCURRENCY,
+    ) -> None:
+        self.pool = pool
+        self.job = job
+        self.on_track = on_track
+        self.on_progress = on_progress
+        self.page_size = page_size
+        self.concurrency = concurrency
+
+        job.update({"seen": 0, "added": 0, "skipped": 0, "failed": 0})
+
+    def start(self):
+        """Run the import on the import pool; returns the job."""
+        try:
+            import_pool.submit(self.run)
+        except ExecutorQueueFullException as err:
+            JobManager.fail(self.job, err)
+            raise
+        return self.job
+
+    @staticmethod
+    def _admitted(submit: Callable[..., Future], *args, **kwargs) -> Future:
+        """`submit(*args, **kwargs)`, retried for as long as the pool is full."""
+        while True:
+            try:
+                return submit(*args, **kwargs)
+            except ExtractionQueueFullException:
+                sleep(0.5)
+
+    def _settle(self, fut: Future):
+        try:
+            track = fut.result()
+        except VideoIsOverLengthException:
+            # over the limit, but the flat entry did not say how long it was
+            self.job["skipped"] += 1
+            return
+        except Exception:
+            self.job["failed"] += 1
+            return
+
+        self.job["added"] += 1
+        self.on_track(track)
+
+    def run(self):
+        job = self.job
+        in_flight: deque[Future] = deque()
+        start = 1
+        try:
+            while True:
+                page = self._admitted(
+                    self.pool.call,
+                    extractor.fetch_playlist_page,
+                    job["url"],
+                    start,
+                    self.page_size,
+                ).result()
+
+                for entry in page["entries"]:
+                    job["seen"] += 1
+                    if not entry["url"] or (
+                        entry["duration"] and extractor.check_length(entry)
+                    ):
+                        job["skipped"] += 1
+                        continue
+
+                    if len(in_flight) >= self.concurrency:
+                        self._settle(in_flight.popleft())
+                    in_flight.append(
+                        self._admitted(self.pool.submit, entry["url"], process=False)
+                    )
+
+                self.on_progress(job)
+                # a page can come back short because unavailable entries were
+                # dropped; only an empty one, or the reported length, ends it
+                start += self.page_size
+                if not page["fetched"] or (page["total"] and start > page["total"]):
+                    break
+
+            while in_flight:
+                self._settle(in_flight.popleft())
+            job["status"] = "done"
+        except Exception as err:
+            self._abandon(in_flight)
+            JobManager.fail(job, err)
+
+        self.on_progress(job)
+
+    def _abandon(self, in_flight: deque[Future]):
+        for fut in in_flight:
+            fut.cancel()
+            self.job["failed"] += 1
+
+
+extraction_pool = ExtractionPool()
+import_pool = TaskPool("import", MAX_IMPORTS, IMPORT_QUEUE)
+job_manager = JobManager(extraction_pool)
@@ -0,0 +1,304 @@
+"""Loudness normalisation: ITU-R BS.1770 / EBU R128 measurement in NumPy.
+
+Tracks are decoded to PCM once, off the playback path (fetching and decoding
+on the I/O pool, metering on the CPU pool), and their integrated loudness and
+true peak are cached by video id. Playback then applies a
+gain only to tracks that are far enough from the target.
+"""
+
+import math
+import subprocess
+from threading import Lock
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:  # normalisation is simply off without NumPy
+    np = None
+
+from src.utils.cache import ExtractorCache, LRUCache
+from src.utils.errors import ExecutorQueueFullException
+from src.utils.executors import cpu_pool, io_pool
+from src.utils.metrics import REGISTRY
+
+__all__ = ("LoudnessMeter", "LoudnessAnalyzer", "analyzer", "measure")
+
+# integrated loudness every track is brought to, in LUFS
+TARGET_LOUDNESS = -14.0
+# gains smaller than this (dB) are not worth leaving the copy path for
+MIN_GAIN = 1.0
+# never boost by more than this (dB), however quiet the track
+MAX_BOOST = 10.0
+# the gained true peak must stay below this, in dBTP
+TRUE_PEAK_LIMIT = -1.0
+# analyses allowed to run at once
+MAX_ANALYSES = 2
+LOUDNESS_TTL = 30 * 24 * 3600.0
+
+RATE = 48000
+CHANNELS = 2
+# 100 ms; four of these with 75% overlap make one 400 ms gating block
+SUB_BLOCK = RATE // 10
+# samples filtered per FFT
+CHUNK = 100 * SUB_BLOCK
+# context before and silence after each chunk that absorb the filter's
+# start-up transient and the FFT's circular wrap-around
+PADDING = RATE // 2
+OVERSAMPLE = 4
+
+LOUDNESS_ANALYSES = REGISTRY.counter(
+    "pylive_loudness_analyses_total", "Track loudness analyses, by outcome."
+)
+
+
+def _biquad_response(b, a, size: int):
+    """Frequency response of a biquad at the `rfft` bins of a `size` transform."""
+    z = np.exp(-2j * np.pi * np.fft.rfftfreq(size))
+    return (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+
+
+def k_weighting(size: int, rate: int = RATE):
+    """The BS.1770 K-weighting filter (high shelf, then high pass) per rfft bin."""
+    # shelf, coefficients derived for any rate as in libebur128
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh**0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = _biquad_response(
+        (
+            (vh + vb * k / q + k * k) / a0,
+            2 * (k * k - vh) / a0,
+            (vh - vb * k / q + k * k) / a0,
+        ),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+        size,
+    )
+
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = _biquad_response(
+        (1.0, -2.0, 1.0),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+        size,
+    )
+    return shelf * highpass
+
+
+class LoudnessMeter:
+    """Integrated loudness and true peak of a stream of PCM frames.
+
+    Frames are filtered a chunk at a time in the frequency domain, so a whole
+    track never has to sit in memory; only one mean square per channel and
+    100 ms is kept.
+    """
+
+    def __init__(self, channels: int = CHANNELS) -> None:
+        self.channels = channels
+        self._pending = np.zeros((0, channels), dtype=np.float32)
+        self._context = np.zeros((PADDING, channels), dtype=np.float32)
+        self._energies: list = []
+        self.peak = 0.0
+        self._size = PADDING + CHUNK + PADDING
+        self._weighting = k_weighting(self._size)[:, None]
+
+    def feed(self, frames):
+        """Add float frames shaped (samples, channels)."""
+        self._pending = np.concatenate((self._pending, frames))
+        while len(self._pending) >= CHUNK:
+            self._process(self._pending[:CHUNK])
+            self._pending = self._pending[CHUNK:]
+
+    def _process(self, chunk):
+        count = len(chunk)
+        segment = np.zeros((self._size, self.channels))
+        segment[:PADDING] = self._context
+        segment[PADDING : PADDING + count] = chunk
+        self._context = segment[count : PADDING + count].astype(np.float32)
+
+        spectrum = np.fft.rfft(segment, axis=0)
+
+        weighted = np.fft.irfft(spectrum * self._weighting, self._size, axis=0)
+        whole = count - count % SUB_BLOCK
+        blocks = weighted[PADDING : PADDING + whole].reshape(
+            -1, SUB_BLOCK, self.channels
+        )
+        self._energies.append(np.mean(blocks * blocks, axis=1))
+
+        # true peak: band-limited interpolation by zero-padding the spectrum
+        upsampled = np.fft.irfft(spectrum, self._size * OVERSAMPLE, axis=0)
+        region = upsampled[PADDING * OVERSAMPLE : (PADDING + count) * OVERSAMPLE]
+        if len(region):
+            self.peak = max(self.peak, float(np.max(np.abs(region))) * OVERSAMPLE)
+
+    def finish(self):
+        if len(self._pending):
+            self._process(self._pending)
+            self._pending = self._pending[:0]
+
+    @property
+    def integrated(self) -> float:
+        """Gated integrated loudness in LUFS; -inf for silence."""
+        if not self._energies:
+            return -math.inf
+        energies = np.concatenate(self._energies)
+        if len(energies) < 4:
+            return -math.inf
+
+        # 400 ms blocks every 100 ms, summed over channels (all weighted 1.0)
+        blocks = (energies[:-3] + energies[1:-2] + energies[2:-1] + energies[3:]) / 4
+        power = blocks.sum(axis=1)
+        with np.errstate(divide="ignore"):
+            loudness = -0.691 + 10 * np.log10(power)
+
+        gated = power[loudness > -70.0]
+        if not len(gated):
+            return -math.inf
+
+        relative = -0.691 + 10 * math.log10(gated.mean()) - 10.0
+        gated = power[(loudness > -70.0) & (loudness > relative)]
+        return -0.691 + 10 * math.log10(gated.mean())
+
+    @property
+    def true_peak(self) -> float:
+        """True peak in dBTP."""
+        return 20 * math.log10(self.peak) if self.peak > 0 else -math.inf
+
+
+def decode(source: str):
+    """Decode `source` with ffmpeg into float32 blocks of (samples, channels)."""
+    process = subprocess.Popen(
+        [
+            "ffmpeg",
+            "-nostdin",
+            "-i",
+            source,
+            "-vn",
+            "-ac",
+            str(CHANNELS),
+            "-ar",
+            str(RATE),
+            "-f",
+            "f32le",
+            "-loglevel",
+            "error",
+            "pipe:1",
+        ],
+        stdout=subprocess.PIPE,
+        stdin=None,
+        stderr=None,
+    )
+
+    frame_size = 4 * CHANNELS
+    try:
+        while True:
+            data = process.stdout.read(CHUNK * frame_size)  # type: ignore
+            if not data:
+                break
+            data = data[: len(data) - len(data) % frame_size]
+            yield np.frombuffer(data, dtype=np.float32).reshape(-1, CHANNELS)
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with {process.returncode}")
+    finally:
+        process.kill()
+
+
+def measure(source: str, offload: bool = False) -> dict[str, float]:
+    """Decode `source` with ffmpeg and measure it.
+
+    With `offload`, the calling thread only waits on ffmpeg and each block is
+    metered on the CPU pool while the next one is read.
+    """
+    meter = LoudnessMeter()
+    metering = None
+    for block in decode(source):
+        if metering:
+            metering.result()
+            metering = None
+        if offload:
+            try:
+                metering = cpu_pool.submit(meter.feed, block)
+                continue
+            except ExecutorQueueFullException:
+                pass
+        meter.feed(block)
+    if metering:
+        metering.result()
+
+    meter.finish()
+    return {"integrated": meter.integrated, "true_peak": meter.true_peak}
+
+
+class LoudnessAnalyzer:
+    """Measures tracks in the background and turns the results into gains."""
+
+    def __init__(self, max_running: int = MAX_ANALYSES) -> None:
+        self.max_running = max_running
+        self.cache = LRUCache("loudness", 4096, LOUDNESS_TTL)
+        self.lock = Lock()
+        self.running: set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return np is not None
+
+    def schedule(self, track: dict, source: str):
+        """Measure `track` from `source` in the background unless it is known."""
+        if not self.enabled or not track.get("id") or track.get("is_live"):
+            return
+
+        key = ExtractorCache.make_key(track)
+        with self.lock:
+            if key in self.running or len(self.running) >= self.max_running:
+                return
+            if self.cache.get(key) is not None:
+                return
+            self.running.add(key)
+
+        try:
+            io_pool.submit(self._run, key, source)
+        except ExecutorQueueFullException:
+            with self.lock:
+                self.running.discard(key)
+
+    def _run(self, key: str, source: str):
+        try:
+            result = measure(source, offload=True)
+        except Exception as err:
+            print(f"loudness analysis failed for {key}")
+            print(err.__class__.__name__, str(err))
+            LOUDNESS_ANALYSES.inc(outcome="failed")
+            return
+        finally:
+            with self.lock:
+                self.running.discard(key)
+
+        if math.isinf(result["integrated"]):
+            # silence; nothing to normalise
+            result["integrated"] = TARGET_LOUDNESS
+        self.cache.put(key, result)
+        LOUDNESS_ANALYSES.inc(outcome="done")
+        print(
+            f"loudness of {key}: {result['integrated']:.1f} LUFS,"
+            f" {result['true_peak']:.1f} dBTP"
+        )
+
+    def gain_for(self, track: dict) -> Optional[float]:
+        """dB to apply to `track`, or None to play it unchanged."""
+        if not self.enabled or not track.get("id"):
+            return None
+
+        result = self.cache.get(ExtractorCache.make_key(track))
+        if not result:
+            return None
+
+        gain = min(
+            TARGET_LOUDNESS - result["integrated"],
+            MAX_BOOST,
+            TRUE_PEAK_LIMIT - result["true_peak"],
+        )
+        return gain if abs(gain) >= MIN_GAIN else None
+
+
+analyzer = LoudnessAnalyzer()
@@ -0,0 +1,166 @@
+import subprocess
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import TYPE_CHECKING, Callable, Optional, Union
+
+from src.utils.metrics import record_exit
+
+if TYPE_CHECKING:
+    from src.audio import QueueAudioHandler
+
+__all__ = ("TrackPrefetcher", "entry_key")
+
+# how many upcoming queue entries get their stream URL resolved ahead of time
+LOOKAHEAD_DEPTH = 2
+# seconds before the end of the current track to spawn the next track's ffmpeg
+WARM_LEAD = 20.0
+
+
+def entry_key(entry: Union[str, dict]) -> str:
+    if isinstance(entry, str):
+        return entry
+    return entry.get("webpage_url", "")
+
+
+class TrackPrefetcher:
+    """Resolves the next queue entries and warms their ffmpeg in the background.
+
+    By the time the current track ends, the next one already has a stream URL
+    and an ffmpeg process that has connected to it and filled its stdout pipe,
+    so the handoff in `ffmpeg_stdin_writer` is a switch between pipes.
+    """
+
+    def __init__(
+        self,
+        handler: "QueueAudioHandler",
+        resolve: Callable[[Union[str, dict]], Optional[dict]],
+        spawn: Callable[[dict], Optional[subprocess.Popen]],
+        depth: int = LOOKAHEAD_DEPTH,
+        warm_lead: float = WARM_LEAD,
+    ) -> None:
+        self.handler = handler
+        self._resolve = resolve
+        self._spawn = spawn
+        self.depth = depth
+        self.warm_lead = warm_lead
+
+        self.lock = Lock()
+        self.resolved: dict[str, dict] = {}
+        self.warm: Optional[tuple[str, subprocess.Popen]] = None
+        # the entry popped for playback whose warm process is not taken yet
+        self.handing_over: Optional[str] = None
+        self._wake = Event()
+
+        self.thread = Thread(target=self.run, name="prefetcher", daemon=True)
+        self.thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def resolve(self, entry: Union[str, dict]) -> Optional[dict]:
+        """Return the resolved track for `entry`, resolving it now on a miss.
+
+        `entry` is the one about to play: its warm process is kept for
+        `take_process` even though it left the queue.
+        """
+        with self.lock:
+            self.handing_over = entry_key(entry)
+            track = self.resolved.pop(entry_key(entry), None)
+
+        if track is None:
+            track = self._resolve(entry)
+        return track
+
+    def take_process(self, track: dict) -> Optional[subprocess.Popen]:
+        """Hand over the warmed ffmpeg for `track`, if there is a live one."""
+        with self.lock:
+            warm, self.warm = self.warm, None
+            self.handing_over = None
+
+        if not warm:
+            return None
+
+        key, process = warm
+        if key == entry_key(track) and process.poll() is None:
+            return process
+
+        record_exit(process, station=self.handler.name, kind="track")
+        return None
+
+    def _time_left(self) -> float:
+        """Seconds left of the track being written, not of `now_playing`.
+
+        `now_playing` already is the next track while the writer finishes
+        the last one, which would pair one's start with the other's length.
+        """
+        started = self.handler.track_started
+        if not started:
+            return float("inf")
+        return self.handler.track_duration - (monotonic() - started)
+
+    def _step(self):
+        upcoming = self.handler.upcoming(self.depth)
+        keys = [entry_key(entry) for entry in upcoming]
+
+        with self.lock:
+            for key in list(self.resolved):
+                if key not in keys:
+                    del self.resolved[key]
+
+        for key, entry in zip(keys, upcoming):
+            if key in self.resolved:
+                continue
+
+            try:
+                track = self._resolve(entry)
+            except Exception as err:
+                print(f"prefetch failed for {key}: {err.__class__.__name__}")
+                continue
+
+            if track:
+                with self.lock:
+                    self.resolved[key] = track
+
+        if not keys or self._time_left() > self.warm_lead:
+            return
+
+        with self.lock:
+            track = self.resolved.get(keys[0])
+            warm = self.warm
+            if not track or (warm and warm[0] in (keys[0], self.handing_over)):
+                # already warm, or the warm one is about to be taken over
+                return
+            # replaced here and nowhere else, so `take_process` cannot get a
+            # process that is being killed
+            self.warm = None
+
+        if warm:
+            record_exit(warm[1], station=self.handler.name, kind="track")
+
+        process = self._spawn(track)
+        if not process:
+            return
+        with self.lock:
+            if self.warm is None and not self.handler.closed.is_set():
+                self.warm, process = (keys[0], process), None
+        if process:
+            record_exit(process, station=self.handler.name, kind="track")
+
+    def stop(self):
+        with self.lock:
+            warm, self.warm = self.warm, None
+        if warm:
+            record_exit(warm[1], station=self.handler.name, kind="track")
+
+    def run(self):
+        while not self.handler.closed.is_set():
+            self._wake.wait(1.0)
+            self._wake.clear()
+            try:
+                self._step()
+            except Exception as err:
+                print("prefetcher error")
+                print(err.__class__.__name__, str(err))
+
+        # a process may have been warmed while the handler was closing
+        self.stop()
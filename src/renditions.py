@@ -0,0 +1,144 @@
+import subprocess
+from threading import Lock, Thread
+from time import monotonic
+from typing import Optional
+
+from src.utils.broadcast import BroadcastHub, Listener
+from src.utils.metrics import FFMPEG_SPAWNS, record_exit
+from src.utils.opusreader import OggError, OggPageReader
+
+__all__ = ("Rendition", "RENDITION_BITRATES")
+
+# extra bitrates (kbps) a station can serve besides its source stream
+RENDITION_BITRATES = (48, 64)
+# seconds an encoder keeps running after its last listener left
+IDLE_GRACE = 10.0
+
+
+class Rendition:
+    """A lower bitrate copy of a station's stream, encoded once for all listeners.
+
+    The encoder only runs while someone listens: the first subscriber starts
+    it, and it stops `IDLE_GRACE` seconds after the last one leaves.
+    """
+
+    KIND = "rendition"
+
+    def __init__(self, source: BroadcastHub, bitrate: int, name: str = "") -> None:
+        self.source = source
+        self.bitrate = bitrate
+        self.name = name
+
+        self.lock = Lock()
+        self.hub = BroadcastHub()
+        self.process: Optional[subprocess.Popen] = None
+        self.spawn_count = 0
+
+    @property
+    def label(self) -> str:
+        return f"{self.bitrate}k"
+
+    @property
+    def listener_count(self) -> int:
+        return self.hub.listener_count if self.process else 0
+
+    def subscribe(self, backlog: float = 0.0, **policy) -> Listener:
+        """Attach a listener; `policy` is passed on to `BroadcastHub.subscribe`."""
+        with self.lock:
+            if self.process is None:
+                self._start()
+            return self.hub.subscribe(backlog, **policy)
+
+    def _spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            [
+                "ffmpeg",
+                "-f",
+                "ogg",
+                "-i",
+                "-",
+                "-threads",
+                "1",
+                "-c:a",
+                "libopus",
+                "-b:a",
+                f"{self.bitrate}k",
+                "-f",
+                "opus",
+                "-loglevel",
+                "error",
+                "pipe:1",
+            ],
+            stdout=subprocess.PIPE,
+            stdin=subprocess.PIPE,
+            stderr=None,
+            # pages must reach the encoder as they come, not once 8 KiB piled up
+            bufsize=0,
+        )
+
+    def _start(self):
+        self.hub = BroadcastHub()
+        self.process = self._spawn()
+        self.spawn_count += 1
+        FFMPEG_SPAWNS.inc(station=self.name, kind=self.KIND)
+
+        tag = f"{self.name}:{self.label}"
+        Thread(
+            target=self._feed,
+            args=(self.process, self.source.subscribe()),
+            name=f"{self.KIND}_feed:{tag}",
+            daemon=True,
+        ).start()
+        Thread(
+            target=self._read,
+            args=(self.process, self.hub),
+            name=f"{self.KIND}_read:{tag}",
+            daemon=True,
+        ).start()
+
+    def stop(self):
+        with self.lock:
+            process, self.process = self.process, None
+        if process:
+            process.kill()
+
+    def _feed(self, process: subprocess.Popen, source: Listener):
+        idle_since = None
+        try:
+            process.stdin.write(self.source.wait_for_header())  # type: ignore
+            for chunk in source:
+                if self.hub.listener_count:
+                    idle_since = None
+                elif idle_since is None:
+                    idle_since = monotonic()
+                elif monotonic() - idle_since > IDLE_GRACE:
+                    with self.lock:
+                        if not self.hub.listener_count and self.process is process:
+                            self.process = None
+                            break
+                    idle_since = None
+
+                process.stdin.write(chunk)  # type: ignore
+        except (BrokenPipeError, ValueError):
+            pass
+        finally:
+            source.close()
+            with self.lock:
+                if self.process is process:
+                    self.process = None
+            record_exit(process, station=self.name, kind=self.KIND)
+
+    @staticmethod
+    def _read(process: subprocess.Popen, hub: BroadcastHub):
+        pages_iter = OggPageReader(process.stdout).iter_pages()  # type: ignore
+        try:
+            hub.set_header(bytes(next(pages_iter)) + bytes(next(pages_iter)))
+            for page in pages_iter:
+                hub.publish(bytes(page), page.gran_pos)
+        except (StopIteration, ValueError):
+            pass
+        except OggError as err:
+            print(f"bad rendition output ({err})")
+            process.kill()
+        finally:
+            hub.close()
@@ -0,0 +1,147 @@
+import math
+from collections import deque
+from threading import Lock, Thread
+from time import monotonic
+from typing import Optional
+
+from src.utils.broadcast import GRANULE_RATE, NO_GRANULE, BroadcastHub
+from src.utils.opusreader import OggPageView
+
+__all__ = ("Segmenter", "SEGMENT_DURATION", "SEGMENT_WINDOW")
+
+# seconds of audio per segment, measured by granule position
+SEGMENT_DURATION = 4.0
+# segments listed in the rolling playlist
+SEGMENT_WINDOW = 6
+# seconds without a playlist or segment request before segmenting stops
+IDLE_TIMEOUT = 60.0
+
+
+class Segmenter:
+    """Cuts a station's live pages into short standalone Ogg segments.
+
+    Every segment starts with the Opus header pages, so each one decodes on
+    its own and can be cached by a reverse proxy like any static file. Only
+    the latest segments are kept, in memory. The segmenter runs while its
+    playlist or segments are being requested and stops `IDLE_TIMEOUT` seconds
+    after the last request.
+    """
+
+    def __init__(
+        self,
+        source: BroadcastHub,
+        name: str = "",
+        duration: float = SEGMENT_DURATION,
+        window: int = SEGMENT_WINDOW,
+    ) -> None:
+        self.source = source
+        self.name = name
+        self.duration = duration
+        self.window = window
+
+        self.lock = Lock()
+        # (media sequence, duration, data, discontinuity); a couple more than
+        # listed so clients holding a slightly old playlist can still fetch them
+        self.segments: deque[tuple[int, float, bytes, bool]] = deque(maxlen=window + 2)
+        # the next segment follows a restart of the source encoder
+        self.discontinuity = False
+        self.sequence = 0
+        self.thread: Optional[Thread] = None
+        self.last_request = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.thread is not None
+
+    def touch(self):
+        """Note a client request, starting the segmenter if it is not running."""
+        self.last_request = monotonic()
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(
+                    target=self.run, name=f"segmenter:{self.name}", daemon=True
+                )
+                self.thread.start()
+
+    def playlist(self) -> str:
+        with self.lock:
+            listed = list(self.segments)[-self.window :]
+
+        target = max([self.duration] + [duration for _, duration, _, _ in listed])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{math.ceil(target)}",
+            f"#EXT-X-MEDIA-SEQUENCE:{listed[0][0] if listed else self.sequence}",
+        ]
+        for sequence, duration, _, discontinuity in listed:
+            if discontinuity:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(f"{sequence}.ogg")
+        return "\n".join(lines) + "\n"
+
+    def segment(self, sequence: int) -> Optional[bytes]:
+        with self.lock:
+            for number, _, data, _ in self.segments:
+                if number == sequence:
+                    return data
+        return None
+
+    def _cut(self, pages: list[bytes], duration: float):
+        data = self.source.header + b"".join(pages)
+        with self.lock:
+            self.segments.append((self.sequence, duration, data, self.discontinuity))
+            self.discontinuity = False
+            self.sequence += 1
+
+    def run(self):
+        listener = self.source.subscribe()
+        pages: list[bytes] = []
+        start = NO_GRANULE
+        # header pages still to skip after an inlined header
+        header_pages = 0
+        try:
+            self.source.wait_for_header()
+            for chunk in listener:
+                if monotonic() - self.last_request > IDLE_TIMEOUT:
+                    break
+
+                view = memoryview(chunk)
+                offset = 0
+                # a chunk is one or more whole pages; split it back into pages
+                while offset < len(view):
+                    page = OggPageView(view[offset:])
+                    size = 27 + page.segnum + sum(page.segtable)
+                    granule = page.gran_pos
+                    offset += size
+
+                    if page.flag & 2:
+                        # the encoder restarted: its header pages are inlined
+                        # here, and every segment gets them prepended anyway
+                        pages = []
+                        start = NO_GRANULE
+                        header_pages = 1
+                        self.discontinuity = True
+                        continue
+                    if header_pages:
+                        header_pages -= 1
+                        continue
+                    pages.append(chunk[offset - size : offset])
+
+                    if granule >= 1 << 63:
+                        continue
+                    if start == NO_GRANULE or granule < start:
+                        start = granule
+                        continue
+
+                    elapsed = (granule - start) / GRANULE_RATE
+                    if elapsed >= self.duration:
+                        self._cut(pages, elapsed)
+                        pages = []
+                        start = granule
+        finally:
+            listener.close()
+            with self.lock:
+                self.thread = None
+                self.segments.clear()
@@ -0,0 +1,232 @@
+import re
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Optional
+
+from src import audio as audio_module
+from src.audio import QueueAudioHandler
+from src.jobs import extraction_pool
+from src.utils import extractor
+from src.utils.metrics import REGISTRY
+
+__all__ = ("StationManager", "DEFAULT_STATION")
+
+DEFAULT_STATION = "main"
+# seconds a station may go without listeners or event subscribers
+IDLE_TIMEOUT = 300.0
+MAX_STATIONS = 16
+
+STATION_NAME = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+# first path segments that belong to global routes; the app adds the rest of
+# its url map with `reserve`
+RESERVED_NAMES = {"static"}
+
+
+class StationManager:
+    """Named, independent audio pipelines living in one process.
+
+    Stations are created explicitly (`get(name, create=True)`, i.e. by /add or
+    /<station>/create) and torn down once they have been idle for
+    `idle_timeout` seconds, which kills their ffmpeg processes. The default
+    station is never torn down. Everything module-level (extractor cache,
+    extraction pool, audio cache, HTTP connections) is shared between them.
+    """
+
+    def __init__(
+        self, idle_timeout: float = IDLE_TIMEOUT, max_stations: int = MAX_STATIONS
+    ) -> None:
+        self.idle_timeout = idle_timeout
+        self.max_stations = max_stations
+        self.lock = Lock()
+        self.stations: dict[str, QueueAudioHandler] = {}
+        self.last_active: dict[str, float] = {}
+        self.reserved = set(RESERVED_NAMES)
+
+        self._register_metrics()
+
+        self._reaper = Thread(
+            target=self.reap_forever, name="station_reaper", daemon=True
+        )
+        self._reaper.start()
+
+    def reserve(self, names):
+        """Keep `names` (first path segments of global routes) from being stations."""
+        self.reserved.update(names)
+
+    def is_valid_name(self, name: str) -> bool:
+        return bool(STATION_NAME.match(name)) and name not in self.reserved
+
+    def get(
+        self, name: str = DEFAULT_STATION, create: bool = False
+    ) -> Optional[QueueAudioHandler]:
+        """The station called `name`; with `create`, it is started if needed."""
+        with self.lock:
+            station = self.stations.get(name)
+            if station is None:
+                if not create or not self.is_valid_name(name):
+                    return None
+                if len(self.stations) >= self.max_stations:
+                    return None
+
+                print(f"Starting station {name}")
+                station = self.stations[name] = QueueAudioHandler(name)
+
+            self.last_active[name] = monotonic()
+            return station
+
+    def __iter__(self):
+        return iter(list(self.stations.values()))
+
+    def _register_metrics(self):
+        """Gauges read at scrape time; nothing here runs on the audio threads."""
+
+        def listeners():
+            for station in self:
+                yield (
+                    {"station": station.name, "bitrate": "source"},
+                    station.hub.listener_count,
+                )
+                for bitrate, rendition in station.renditions.items():
+                    yield (
+                        {"station": station.name, "bitrate": bitrate},
+                        rendition.listener_count,
+                    )
+
+        def stream_listeners():
+            for station in self:
+                hubs = [("source", station.hub)] + [
+                    (bitrate, rendition.hub)
+                    for bitrate, rendition in station.renditions.items()
+                    if rendition.listener_count
+                ]
+                for bitrate, hub in hubs:
+                    for listener in hub.listeners():
+                        labels = {
+                            "station": station.name,
+                            "bitrate": bitrate,
+                            "listener": listener.id,
+                        }
+                        yield labels, listener
+
+        def listener_lag():
+            for labels, listener in stream_listeners():
+                yield labels, listener.lag
+
+        def listener_lag_seconds():
+            for labels, listener in stream_listeners():
+                yield labels, listener.lag_seconds
+
+        def listener_skips():
+            for labels, listener in stream_listeners():
+                yield labels, listener.skips
+
+        def listener_sent():
+            for labels, listener in stream_listeners():
+                yield labels, listener.sent
+
+        def listener_dropped():
+            for station in self:
+                for listener in station.hub.listeners():
+                    labels = {"station": station.name, "listener": listener.id}
+                    yield labels, listener.dropped
+
+        def queue_length():
+            for station in self:
+                yield {"station": station.name, "queue": "queue"}, len(station.queue)
+                yield (
+                    {"station": station.name, "queue": "auto_queue"},
+                    len(station.auto_queue),
+                )
+
+        def cache_stats():
+            caches = dict(extractor.cache.stats())
+            if audio_module.audio_cache:
+                caches["audio"] = audio_module.audio_cache.stats()
+
+            for cache, stats in caches.items():
+                for stat, value in stats.items():
+                    if isinstance(value, (int, float)):
+                        yield {"cache": cache, "stat": stat}, value
+
+        REGISTRY.gauge(
+            "pylive_stations", "Running stations.", lambda: len(self.stations)
+        )
+        REGISTRY.gauge(
+            "pylive_listeners", "Connected /stream listeners, by bitrate.", listeners
+        )
+        REGISTRY.gauge(
+            "pylive_listener_lag_pages",
+            "Pages published but not yet sent, per listener.",
+            listener_lag,
+        )
+        REGISTRY.gauge(
+            "pylive_listener_lag_seconds",
+            "How far behind the live edge each listener is, by granule position.",
+            listener_lag_seconds,
+        )
+        REGISTRY.gauge(
+            "pylive_listener_skipped",
+            "Times a listener was skipped ahead after exceeding its lag budget.",
+            listener_skips,
+        )
+        REGISTRY.gauge(
+            "pylive_listener_sent_bytes",
+            "Audio bytes handed to each listener since it connected.",
+            listener_sent,
+        )
+        REGISTRY.gauge(
+            "pylive_listener_dropped_pages",
+            "Pages a listener fell too far behind to receive.",
+            listener_dropped,
+        )
+        REGISTRY.gauge(
+            "pylive_event_subscribers",
+            "Connected /watch_event clients.",
+            lambda: (
+                ({"station": station.name}, station.event_queue.subscriber_count)
+                for station in self
+            ),
+        )
+        REGISTRY.gauge(
+            "pylive_waveform_subscribers",
+            "Connected /waveform clients.",
+            lambda: (
+                ({"station": station.name}, station.waveform.listener_count)
+                for station in self
+            ),
+        )
+        REGISTRY.gauge("pylive_queue_length", "Entries waiting to play.", queue_length)
+        REGISTRY.gauge(
+            "pylive_extraction_pending",
+            "Extractions running or waiting for a worker.",
+            lambda: extraction_pool.pending,
+        )
+        REGISTRY.gauge("pylive_cache", "Cache sizes and hit counts.", cache_stats)
+
+    def reap(self):
+        now = monotonic()
+        with self.lock:
+            for name, station in list(self.stations.items()):
+                if name == DEFAULT_STATION:
+                    continue
+
+                if not station.is_idle:
+                    self.last_active[name] = now
+                    continue
+
+                if now - self.last_active[name] < self.idle_timeout:
+                    continue
+
+                print(f"Stopping idle station {name}")
+                del self.stations[name]
+                del self.last_active[name]
+                station.close()
+
+    def reap_forever(self):
+        while True:
+            sleep(min(30.0, self.idle_timeout))
+            try:
+                self.reap()
+            except Exception as err:
+                print("station reaper error")
+                print(err.__class__.__name__, str(err))
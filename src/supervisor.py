@@ -0,0 +1,143 @@
+from threading import Lock, Thread
+from time import monotonic
+from typing import TYPE_CHECKING, Optional
+
+from src.utils.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from src.audio import QueueAudioHandler
+
+__all__ = ("PipelineSupervisor",)
+
+# seconds the stdin writer may stay blocked on the master, or the master may
+# stay silent while it is being fed, before it is considered stalled
+MASTER_STALL_TIMEOUT = 10.0
+# seconds a track's ffmpeg may produce nothing (it reconnects for up to 5)
+TRACK_STALL_TIMEOUT = 15.0
+# times one track is restarted after its ffmpeg failed before it is skipped
+MAX_TRACK_RESTARTS = 3
+# seconds between watchdog checks
+CHECK_INTERVAL = 1.0
+# a master that ran this long resets the restart backoff
+STABLE_AFTER = 60.0
+MAX_BACKOFF = 30.0
+
+RESTARTS = REGISTRY.counter(
+    "pylive_pipeline_restarts_total",
+    "ffmpeg processes restarted after they failed or stalled, by kind and reason.",
+)
+RESTART_SECONDS = REGISTRY.histogram(
+    "pylive_pipeline_restart_seconds",
+    "Time from an ffmpeg failing to audio flowing again, by kind.",
+    (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+class PipelineSupervisor:
+    """Restarts a station's ffmpeg processes when they fail or stall.
+
+    The audio threads only stamp what they are waiting on; a watchdog thread
+    compares those stamps against the stall timeouts and kills a stuck
+    process, which the thread reading it then sees as a failure and recovers
+    from like any other exit: the master is respawned behind the same hub,
+    a track resumes where it was. Each failure is counted once, and timed
+    until audio flows again.
+    """
+
+    def __init__(self, handler: "QueueAudioHandler") -> None:
+        self.handler = handler
+        self.lock = Lock()
+
+        # "master" or "track" while the stdin writer is blocked on it
+        self.blocked_on: Optional[str] = None
+        self.blocked_since = 0.0
+        self.last_page = monotonic()
+        self.last_write = 0.0
+        # when the writer last started feeding the master after a pause
+        self.feeding_since = 0.0
+
+        # kind -> monotonic time it failed, until it recovers
+        self.failing: dict[str, float] = {}
+        self.restart_count = 0
+        self.failures_in_row = 0
+
+        self.thread = Thread(
+            target=self.run, name=f"supervisor:{handler.name}", daemon=True
+        )
+        self.thread.start()
+
+    def block(self, on: str):
+        self.blocked_since = monotonic()
+        self.blocked_on = on
+
+    def unblock(self):
+        self.blocked_on = None
+
+    def feeding(self):
+        """Note that the writer starts (or resumes) feeding a track."""
+        self.feeding_since = monotonic()
+
+    def failed(self, kind: str, reason: str) -> bool:
+        """Count a failure of `kind`, unless one is already being recovered from."""
+        with self.lock:
+            if kind in self.failing:
+                return False
+            self.failing[kind] = monotonic()
+            self.restart_count += 1
+
+        RESTARTS.inc(station=self.handler.name, kind=kind, reason=reason)
+        print(f"{self.handler.name}: {kind} ffmpeg {reason}, restarting")
+        return True
+
+    def recovered(self, kind: str):
+        with self.lock:
+            failed_at = self.failing.pop(kind, None)
+        if failed_at is not None:
+            RESTART_SECONDS.observe(
+                monotonic() - failed_at, station=self.handler.name, kind=kind
+            )
+
+    def abandon(self, kind: str):
+        """Stop recovering `kind`; the next failure is counted again."""
+        with self.lock:
+            self.failing.pop(kind, None)
+
+    def backoff(self, ran_for: float) -> float:
+        """Seconds to wait before respawning a master that ran `ran_for` seconds."""
+        if ran_for > STABLE_AFTER:
+            self.failures_in_row = 0
+        delay = min(2.0**self.failures_in_row - 1, MAX_BACKOFF)
+        self.failures_in_row += 1
+        return delay
+
+    def _check(self):
+        handler = self.handler
+        now = monotonic()
+        blocked_for = now - self.blocked_since
+
+        if self.blocked_on == "master" and blocked_for > MASTER_STALL_TIMEOUT:
+            stalled = "master"
+        elif (
+            now - self.last_write < CHECK_INTERVAL
+            and now - max(self.last_page, self.feeding_since) > MASTER_STALL_TIMEOUT
+        ):
+            # fed, but not putting anything out
+            stalled = "master"
+        elif self.blocked_on == "track" and blocked_for > TRACK_STALL_TIMEOUT:
+            stalled = "track"
+        else:
+            return
+
+        process = handler.ffmpeg if stalled == "master" else handler.track_process
+        if process is None or process.poll() is not None:
+            return
+        if self.failed(stalled, "stall"):
+            process.kill()
+
+    def run(self):
+        while not self.handler.closed.wait(CHECK_INTERVAL):
+            try:
+                self._check()
+            except Exception as err:
+                print("supervisor error")
+                print(err.__class__.__name__, str(err))
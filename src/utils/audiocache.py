@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import mmap
+import os
+import re
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+__all__ = (
+    "AudioCache",
+    "AudioCacheRecorder",
+)
+
+
+class AudioCache:
+    """Size-bounded LRU of finished tracks' Opus streams on local disk.
+
+    Files are named after the track's extractor and id. A track is only
+    committed once it played to the end, so a file in the cache is always a
+    complete stream.
+    """
+
+    SUFFIX = ".opus"
+
+    def __init__(self, directory: str, max_bytes: int = 2 << 30) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".part"):
+                os.remove(path)
+            elif name.endswith(self.SUFFIX):
+                stat = os.stat(path)
+                files.append((stat.st_atime, name[: -len(self.SUFFIX)], stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.size += size
+        self._evict()
+
+    @staticmethod
+    def key_for(track: dict) -> Optional[str]:
+        if not track.get("id") or track.get("id") == "NA":
+            return None
+        return re.sub(r"[^\w-]", "_", f"{track.get('extractor', 'None')}-{track['id']}")
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def __contains__(self, track: dict) -> bool:
+        return self.key_for(track) in self._entries
+
+    def open(self, track: dict) -> Optional[mmap.mmap]:
+        """Memory-map the cached stream of `track`, or None on a miss."""
+        key = self.key_for(track)
+        with self.lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)  # type: ignore
+
+        try:
+            with open(self.path_for(key), "rb") as f:  # type: ignore
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            with self.lock:
+                self.size -= self._entries.pop(key, 0)  # type: ignore
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += len(mapped)
+        return mapped
+
+    def record(self, track: dict) -> Optional[AudioCacheRecorder]:
+        key = self.key_for(track)
+        if not key:
+            return None
+        return AudioCacheRecorder(self, key)
+
+    def _commit(self, key: str, part_path: str):
+        size = os.path.getsize(part_path)
+        os.replace(part_path, self.path_for(key))
+        with self.lock:
+            self.size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+class AudioCacheRecorder:
+    """Tees a track's stream into a partial file until it is committed."""
+
+    def __init__(self, cache: AudioCache, key: str) -> None:
+        self.cache = cache
+        self.key = key
+        self.part_path = cache.path_for(key) + f".{os.getpid()}.{id(self):x}.part"
+        self.file = open(self.part_path, "wb")
+
+    def write(self, data: bytes):
+        self.file.write(data)
+
+    def commit(self):
+        self.file.close()
+        self.cache._commit(self.key, self.part_path)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.part_path)
+        except FileNotFoundError:
+            pass
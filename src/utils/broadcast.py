@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import math
+from itertools import count
+from threading import Condition, Event
+from time import monotonic
+from typing import Generator, Optional
+
+__all__ = (
+    "BroadcastHub",
+    "Listener",
+)
+
+
+# Opus granule positions always count 48 kHz samples (RFC 7845, section 4).
+GRANULE_RATE = 48000
+NO_GRANULE = -1
+
+# seconds a listener with a lag budget may keep falling behind, despite being
+# skipped ahead, before it is dropped
+EVICT_AFTER = 30.0
+
+_listener_ids = count(1)
+
+
+class BroadcastHub:
+    """A fixed-size ring of Ogg pages shared by every listener.
+
+    Every published page gets a monotonically increasing sequence number and
+    is stored exactly once; listeners keep their own cursor into the ring, so
+    publishing costs the same no matter how many listeners are attached.
+    """
+
+    def __init__(self, size: int = 1024) -> None:
+        self.size = size
+        self._pages: list[Optional[bytes]] = [None] * size
+        self._granules: list[int] = [NO_GRANULE] * size
+        self._seq = 0
+        self.header = b""
+        self.header_ready = Event()
+        # first page after the latest header; backlogs never reach before it
+        self._stream_start = 0
+        # whether the page before `_stream_start` is an inlined header
+        self._restarted = False
+        self._cond = Condition()
+        self._listeners: set[Listener] = set()
+        self.closed = False
+
+    @property
+    def head(self) -> int:
+        """Sequence number the next published page will get."""
+        return self._seq
+
+    @property
+    def tail(self) -> int:
+        """Sequence number of the oldest page still held by the ring."""
+        return max(0, self._seq - self.size)
+
+    @property
+    def listener_count(self) -> int:
+        return len(self._listeners)
+
+    def listeners(self) -> list[Listener]:
+        with self._cond:
+            return list(self._listeners)
+
+    def set_header(self, header: bytes):
+        """Set the stream's header pages.
+
+        A later call starts a new logical stream (a restarted encoder): the
+        new header is also published inline, so listeners that already got
+        the old one carry on with a chained Ogg stream.
+        """
+        with self._cond:
+            if self.header:
+                self._pages[self._seq % self.size] = header
+                self._granules[self._seq % self.size] = NO_GRANULE
+                self._seq += 1
+                self._restarted = True
+                self._cond.notify_all()
+            self.header = header
+            self._stream_start = self._seq
+        self.header_ready.set()
+
+    def wait_for_header(self, timeout: Optional[float] = None) -> bytes:
+        self.header_ready.wait(timeout)
+        return self.header
+
+    def publish(self, page: bytes, granule: int = NO_GRANULE):
+        if granule >= 1 << 63:
+            # unsigned read of the -1 "no packet ends on this page" marker
+            granule = NO_GRANULE
+
+        with self._cond:
+            self._pages[self._seq % self.size] = page
+            self._granules[self._seq % self.size] = granule
+            self._seq += 1
+            self._cond.notify_all()
+
+    def backlog_start(self, seconds: float) -> int:
+        """Sequence number of the oldest page within `seconds` of the live edge.
+
+        Distance is measured with granule positions, and the walk stops early
+        at a granule reset so a backlog never spans two logical streams.
+        """
+        if seconds <= 0:
+            return self._seq
+
+        with self._cond:
+            start = self._seq
+            newest = NO_GRANULE
+            oldest = max(self.tail, self._stream_start)
+            for seq in range(self._seq - 1, oldest - 1, -1):
+                granule = self._granules[seq % self.size]
+                if granule == NO_GRANULE:
+                    start = seq
+                    continue
+
+                if newest == NO_GRANULE:
+                    newest = granule
+                elif granule > newest:
+                    break
+
+                if newest - granule > seconds * GRANULE_RATE:
+                    break
+                start = seq
+            return start
+
+    def _find_granule(self, seqs: range) -> int:
+        """The first granule position among the pages `seqs` that carries one."""
+        for seq in seqs:
+            granule = self._granules[seq % self.size]
+            if granule != NO_GRANULE:
+                return granule
+        return NO_GRANULE
+
+    def granule_before(self, seq: int) -> int:
+        """Granule position of the last page before `seq` that carries one."""
+        with self._cond:
+            oldest = max(self.tail, seq - self.size)
+            return self._find_granule(range(seq - 1, oldest - 1, -1))
+
+    def lag_seconds(self, cursor: int) -> float:
+        """How far the page at `cursor` is behind the live edge, by granule."""
+        with self._cond:
+            if cursor >= self._seq:
+                return 0.0
+            if cursor < self.tail:
+                return math.inf
+
+            start = self._stream_start
+            oldest = max(self.tail, start)
+            newest = self._find_granule(range(self._seq - 1, oldest - 1, -1))
+            if cursor >= start:
+                at = self._find_granule(range(cursor, self._seq))
+                if at == NO_GRANULE or newest == NO_GRANULE:
+                    return 0.0
+                return max(0, newest - at) / GRANULE_RATE
+
+            # still in the stream from before the encoder restarted: the rest
+            # of that one, plus everything of the new one
+            at = self._find_granule(range(cursor, start))
+            end = self._find_granule(range(start - 1, cursor - 1, -1))
+            behind = end - at if at != NO_GRANULE else 0
+            return (behind + max(0, newest)) / GRANULE_RATE
+
+    def catch_up(self, cursor: int, seconds: float) -> int:
+        """Where a listener at `cursor` resumes `seconds` behind the live edge.
+
+        Always a page boundary, and never past an inlined header the listener
+        has not been sent yet.
+        """
+        target = self.backlog_start(seconds)
+        with self._cond:
+            header = self._stream_start - 1
+            if self._restarted and cursor <= header < target:
+                target = header
+        return max(cursor, target)
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        # nobody should wait forever on a header that will never come
+        self.header_ready.set()
+
+    def read(
+        self, cursor: int, timeout: Optional[float] = None
+    ) -> tuple[int, list[bytes], int]:
+        """Wait until the page at `cursor` exists and return everything after it.
+
+        Returns the new cursor, the pages from `cursor` up to the live edge and
+        how many pages were overwritten before this reader got to them.
+        """
+        with self._cond:
+            while cursor >= self._seq and not self.closed:
+                if not self._cond.wait(timeout):
+                    return cursor, [], 0
+
+            dropped = 0
+            if cursor < self.tail:
+                dropped = self.tail - cursor
+                cursor = self.tail
+
+            pages = [self._pages[i % self.size] for i in range(cursor, self._seq)]
+            return self._seq, pages, dropped  # type: ignore
+
+    def subscribe(
+        self,
+        backlog: float = 0.0,
+        lag_budget: Optional[float] = None,
+        evict_after: float = EVICT_AFTER,
+    ) -> Listener:
+        """Attach a listener `backlog` seconds behind the live edge.
+
+        With a `lag_budget`, the listener is skipped ahead to `backlog` seconds
+        behind the live edge whenever it falls more than `lag_budget` seconds
+        behind, and ends once it has stayed behind for `evict_after` seconds.
+        """
+        listener = Listener(
+            self, self.backlog_start(backlog), backlog, lag_budget, evict_after
+        )
+        with self._cond:
+            self._listeners.add(listener)
+        return listener
+
+    def unsubscribe(self, listener: Listener):
+        with self._cond:
+            self._listeners.discard(listener)
+
+
+class Listener:
+    __slots__ = (
+        "id",
+        "hub",
+        "cursor",
+        "dropped",
+        "backlog",
+        "lag_budget",
+        "evict_after",
+        "behind_since",
+        "skips",
+        "sent",
+        "evicted",
+        "__weakref__",
+    )
+
+    def __init__(
+        self,
+        hub: BroadcastHub,
+        cursor: int,
+        backlog: float = 0.0,
+        lag_budget: Optional[float] = None,
+        evict_after: float = EVICT_AFTER,
+    ) -> None:
+        self.id = next(_listener_ids)
+        self.hub = hub
+        self.cursor = cursor
+        self.dropped = 0
+        self.backlog = backlog
+        self.lag_budget = lag_budget
+        self.evict_after = evict_after
+        # monotonic time this listener last fell behind, 0.0 while it keeps up
+        self.behind_since = 0.0
+        self.skips = 0
+        self.sent = 0
+        self.evicted = False
+
+    @property
+    def lag(self) -> int:
+        """Number of published pages this listener has not been sent yet."""
+        return self.hub.head - self.cursor
+
+    @property
+    def lag_seconds(self) -> float:
+        return self.hub.lag_seconds(self.cursor)
+
+    def pending(self) -> bytes:
+        """Everything already published for this listener, without blocking."""
+        self.cursor, pages, dropped = self.hub.read(self.cursor, timeout=0)
+        self.dropped += dropped
+        data = b"".join(pages)
+        self.sent += len(data)
+        return data
+
+    def _keep_up(self) -> bool:
+        """Apply the lag budget; False once the listener should be dropped."""
+        lag = self.lag_seconds
+        if lag <= max(self.backlog, 1.0):
+            self.behind_since = 0.0
+            return True
+
+        now = monotonic()
+        if not self.behind_since:
+            self.behind_since = now
+        elif now - self.behind_since > self.evict_after:
+            return False
+
+        if lag > self.lag_budget:  # type: ignore
+            self.cursor = self.hub.catch_up(self.cursor, self.backlog)
+            self.skips += 1
+        return True
+
+    def __iter__(self) -> Generator[bytes, None, None]:
+        while True:
+            self.cursor, pages, dropped = self.hub.read(self.cursor)
+            self.dropped += dropped
+            if not pages:
+                if self.hub.closed:
+                    return
+                continue
+
+            data = b"".join(pages)
+            self.sent += len(data)
+            yield data
+
+            # checked once the chunk was taken, i.e. written to the client
+            if self.lag_budget is not None and not self._keep_up():
+                self.evicted = True
+                return
+
+    def close(self):
+        self.hub.unsubscribe(self)
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+__all__ = (
+    "CacheDB",
+    "LRUCache",
+    "ExtractorCache",
+    "stream_url_expiry",
+)
+
+_YOUTUBE_ID = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)"
+    r"([\w-]{11})"
+)
+
+
+class CacheDB:
+    """SQLite file that lets caches survive a restart."""
+
+    def __init__(self, path: str) -> None:
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT, key TEXT, value TEXT, expires REAL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self.conn.commit()
+
+    def load(self, namespace: str, limit: int) -> list[tuple[str, Any, float]]:
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND expires < ?",
+                (namespace, time()),
+            )
+            rows = self.conn.execute(
+                "SELECT key, value, expires FROM cache WHERE namespace = ? "
+                "ORDER BY rowid DESC LIMIT ?",
+                (namespace, limit),
+            ).fetchall()
+            self.conn.commit()
+        return [(key, json.loads(value), expires) for key, value, expires in rows]
+
+    def put(self, namespace: str, key: str, value: Any, expires: float):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires),
+            )
+            self.conn.commit()
+
+    def delete(self, namespace: str, key: str):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            )
+            self.conn.commit()
+
+
+class LRUCache:
+    """A size-bounded LRU whose entries also expire at a given time."""
+
+    def __init__(
+        self, namespace: str, maxsize: int = 1024, ttl: float = 3600.0
+    ) -> None:
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.db: Optional[CacheDB] = None
+
+        self.lock = Lock()
+        self._data: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def attach(self, db: CacheDB):
+        """Persist entries to `db` and load the ones that have not expired."""
+        rows = db.load(self.namespace, self.maxsize)
+        with self.lock:
+            self.db = db
+            for key, value, expires in reversed(rows):
+                self._data[key] = (value, expires)
+                self._data.move_to_end(key)
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            value, expires = item
+            if expires < time():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any, expires: Optional[float] = None):
+        if expires is None:
+            expires = time() + self.ttl
+
+        with self.lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                if self.db:
+                    self.db.delete(self.namespace, evicted)
+
+        if self.db:
+            self.db.put(self.namespace, key, value, expires)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+def stream_url_expiry(url: str, default_ttl: float = 3600.0) -> float:
+    """When a resolved stream URL stops working.
+
+    googlevideo URLs carry it as an `expire=` unix timestamp, either in the
+    query string or as a `/expire/<ts>/` path segment.
+    """
+    parsed = urlparse(url)
+    expire = parse_qs(parsed.query).get("expire", [None])[0]
+    if not expire:
+        match = re.search(r"/expire/(\d+)", parsed.path)
+        expire = match.group(1) if match else None
+
+    try:
+        return float(expire)  # type: ignore
+    except (TypeError, ValueError):
+        return time() + default_ttl
+
+
+class ExtractorCache:
+    """Caches what `extractor.create` returns, keyed by extractor and video id.
+
+    Metadata is kept for a long time. Stream URLs expire with the URL itself,
+    minus enough headroom to play the whole track.
+    """
+
+    METADATA_TTL = 7 * 24 * 3600.0
+    # a stream URL must stay valid at least this long past the track's length
+    STREAM_URL_MARGIN = 300.0
+
+    def __init__(self, maxsize: int = 4096, stream_maxsize: int = 512) -> None:
+        self.metadata = LRUCache("metadata", maxsize, self.METADATA_TTL)
+        self.stream_urls = LRUCache("stream_url", stream_maxsize)
+        # url -> cache key, for urls the key cannot be read from (searches, ...)
+        self.aliases = LRUCache("alias", maxsize, self.METADATA_TTL)
+
+    def attach(self, db: CacheDB):
+        for cache in (self.metadata, self.stream_urls, self.aliases):
+            cache.attach(db)
+
+    @staticmethod
+    def make_key(data: dict) -> str:
+        return f"{data.get('extractor', 'None')}:{data.get('id', 'NA')}"
+
+    def key_for(self, url: str) -> Optional[str]:
+        match = _YOUTUBE_ID.search(url)
+        if match:
+            return f"youtube:{match.group(1)}"
+        return self.aliases.get(url)
+
+    def get(self, url: str, process: bool = True) -> Optional[dict]:
+        key = self.key_for(url)
+        if not key:
+            return None
+
+        metadata = self.metadata.get(key)
+        if not metadata:
+            return None
+
+        if not process:
+            return dict(metadata)
+
+        stream_url = self.stream_urls.get(key)
+        if not stream_url:
+            return None
+
+        return {**metadata, "url": stream_url, "process": True}
+
+    def put(self, url: str, data: dict):
+        key = self.make_key(data)
+        if self.key_for(url) != key:
+            self.aliases.put(url, key)
+
+        metadata = {k: v for k, v in data.items() if k != "url"}
+        metadata["process"] = False
+        self.metadata.put(key, metadata)
+
+        if data.get("process") and data.get("url"):
+            expires = (
+                stream_url_expiry(data["url"])
+                - self.STREAM_URL_MARGIN
+                - float(data.get("duration") or 0)
+            )
+            if expires > time():
+                self.stream_urls.put(key, data["url"], expires)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            "metadata": self.metadata.stats(),
+            "stream_url": self.stream_urls.stats(),
+        }
@@ -16,3 +16,15 @@ class VideoIsOverLengthException(Exception):
 
 class PlaylistNotFoundException(Exception):
     pass
+
+
+class ExtractionQueueFullException(Exception):
+    pass
+
+
+class ExecutorQueueFullException(Exception):
+    pass
+
+
+class TrackProcessFailedException(Exception):
+    pass
@@ -0,0 +1,120 @@
+"""Shared, bounded thread pools for work that does not deserve its own thread.
+
+`io_pool` is for blocking network or disk work, `cpu_pool` for short
+computations (NumPy, hashing, ...) that release the GIL. Long-lived loops
+(audio readers, prefetchers) keep their dedicated threads.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+from typing import Callable
+
+from .errors import ExecutorQueueFullException
+from .metrics import REGISTRY
+
+__all__ = (
+    "TaskPool",
+    "io_pool",
+    "cpu_pool",
+    "shutdown_pools",
+)
+
+IO_WORKERS = 16
+IO_QUEUE = 256
+CPU_WORKERS = os.cpu_count() or 2
+CPU_QUEUE = 64
+
+TASK_WAIT = REGISTRY.histogram(
+    "pylive_task_wait_seconds",
+    "Time a task spent queued before a worker picked it up.",
+    (0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+TASK_SECONDS = REGISTRY.histogram(
+    "pylive_task_seconds", "Time a task spent running, by pool."
+)
+
+_pools: dict[str, TaskPool] = {}
+
+
+class TaskPool:
+    """A named ThreadPoolExecutor with a bounded backlog and task accounting.
+
+    `submit` raises ExecutorQueueFullException instead of queueing more than
+    `max_queue` tasks, so a burst of requests cannot grow memory or latency
+    without bound.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+
+        self.lock = Lock()
+        self.queued = 0
+        self.active = 0
+        _pools[name] = self
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self.lock:
+            if self.queued >= self.max_queue:
+                raise ExecutorQueueFullException(self.name)
+            self.queued += 1
+
+        submitted = monotonic()
+
+        def task():
+            started = monotonic()
+            with self.lock:
+                self.queued -= 1
+                self.active += 1
+            TASK_WAIT.observe(started - submitted, pool=self.name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.active -= 1
+                TASK_SECONDS.observe(monotonic() - started, pool=self.name)
+
+        try:
+            return self.executor.submit(task)
+        except RuntimeError:
+            # shut down
+            with self.lock:
+                self.queued -= 1
+            raise
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop taking tasks, drop the queued ones and let running ones finish."""
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def shutdown_pools(wait: bool = True):
+    for pool in list(_pools.values()):
+        pool.shutdown(wait)
+
+
+io_pool = TaskPool("io", IO_WORKERS, IO_QUEUE)
+cpu_pool = TaskPool("cpu", CPU_WORKERS, CPU_QUEUE)
+
+REGISTRY.gauge(
+    "pylive_executor_tasks",
+    "Tasks running or queued in the shared pools.",
+    lambda: [
+        ({"pool": pool.name, "state": state}, count)
+        for pool in list(_pools.values())
+        for state, count in (("active", pool.active), ("queued", pool.queued))
+    ],
+)
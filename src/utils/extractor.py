@@ -1,8 +1,11 @@
+from time import monotonic
 from typing import Generator
 
 from yt_dlp import YoutubeDL
 from yt_dlp.utils import DownloadError
 
+from .cache import CacheDB, ExtractorCache
+from .metrics import EXTRACT_SECONDS
 from .errors import (
     VideoIsLiveException,
     VideoIsUnavailableException,
@@ -26,6 +29,21 @@ globopts = {
     "playlistrandom": True,
 }
 
+# shared by every caller of `create`; see `enable_cache_persistence`
+cache = ExtractorCache()
+
+
+def enable_cache_persistence(path: str):
+    """Keep the extractor cache in an SQLite file across restarts."""
+    db = CacheDB(path)
+    cache.attach(db)
+    return db
+
+
+def is_playlist_url(url: str) -> bool:
+    """Playlist links that do not also point at one video in it."""
+    return "/playlist" in url or ("list=" in url and "v=" not in url)
+
 
 def check_length(item: dict) -> bool:
     """Check if length > 15min"""
@@ -43,59 +61,87 @@ def create(url, process=True) -> dict[str, str | bool | float]:
     Returns:
         Union[dict, None]: A dictionary containing information about the video, or None if the video could not be retrieved.
     """
+    cached = cache.get(url, process)
+    if cached:
+        return cached
+
+    started = monotonic()
     with YoutubeDL(globopts) as ytdl:
-        try:
-            data = ytdl.extract_info(url=url, download=False, process=process)
-            if not data:
-                raise VideoIsUnavailableException
-
-            if data.get("entries", False):
-                if isinstance(data["entries"], Generator):
-                    data = next(data["entries"])
-                else:
-                    data = data["entries"][0]
-
-            if data.get("is_live", False):
-                raise VideoIsLiveException
-
-            if check_length(data):
-                raise VideoIsOverLengthException
-
-            need_reencode = False
-            if data.get("asr", 0) != 48000:
-                need_reencode = True
-
-            if data.get("acodec", "none") != "opus":
-                need_reencode = True
-
-            ret = {
-                "title": data.get("title", "NA"),
-                "id": data.get("id", "NA"),
-                "webpage_url": data.get("webpage_url")
-                or data.get("original_url")
-                or data.get("url", "NA"),
-                "duration": data.get("duration", 0.0),
-                "channel": data.get("uploader", "NA"),
-                "channel_url": data.get("uploader_url")
-                or data.get("channel_url", "NA"),
-                "process": False,
-                "extractor": data.get("extractor", "None"),
-                "need_reencode": need_reencode,
-            }
+        ret = extract(ytdl, url, process)
+    EXTRACT_SECONDS.observe(monotonic() - started, process=process)
 
-            if process:
-                ret.update(
-                    {
-                        "url": data.get("url"),
-                        "process": True,
-                        "format_duration": data.get("duration_string", "0:00"),
-                    }
-                )
+    cache.put(url, ret)
+    return ret
 
-            return ret
-        except DownloadError:
+
+def extract(ytdl: YoutubeDL, url, process=True) -> dict[str, str | bool | float]:
+    """Does the actual work of `create` with a given YoutubeDL, bypassing the cache."""
+    try:
+        data = ytdl.extract_info(url=url, download=False, process=process)
+        if not data:
             raise VideoIsUnavailableException
 
+        if data.get("entries", False):
+            if isinstance(data["entries"], Generator):
+                data = next(data["entries"])
+            else:
+                data = data["entries"][0]
+
+        if data.get("is_live", False):
+            raise VideoIsLiveException
+
+        if check_length(data):
+            raise VideoIsOverLengthException
+
+        need_reencode = False
+        if data.get("asr", 0) != 48000:
+            need_reencode = True
+
+        if data.get("acodec", "none") != "opus":
+            need_reencode = True
+
+        ret = {
+            "title": data.get("title", "NA"),
+            "id": data.get("id", "NA"),
+            "webpage_url": data.get("webpage_url")
+            or data.get("original_url")
+            or data.get("url", "NA"),
+            "duration": data.get("duration", 0.0),
+            "channel": data.get("uploader", "NA"),
+            "channel_url": data.get("uploader_url") or data.get("channel_url", "NA"),
+            "process": False,
+            "extractor": data.get("extractor", "None"),
+            "need_reencode": need_reencode,
+        }
+
+        if process:
+            ret.update(
+                {
+                    "url": data.get("url"),
+                    "process": True,
+                    "format_duration": data.get("duration_string", "0:00"),
+                }
+            )
+
+        return ret
+    except DownloadError:
+        raise VideoIsUnavailableException
+
+
+# long-lived YoutubeDL of an extraction worker process, see src/jobs.py
+_worker_ytdl = None
+
+
+def init_worker():
+    global _worker_ytdl
+    _worker_ytdl = YoutubeDL(globopts)
+
+
+def worker_create(url, process=True) -> dict[str, str | bool | float]:
+    if _worker_ytdl is None:
+        init_worker()
+    return extract(_worker_ytdl, url, process)  # type: ignore
+
 
 def fetch_playlist(url_playlist) -> list:
     item: dict
@@ -124,3 +170,50 @@ def fetch_playlist(url_playlist) -> list:
                 print(f"{item['url']} is private")
 
     return playlist
+
+
+def fetch_playlist_page(url_playlist, start: int, count: int) -> dict:
+    """
+    Flat entries `start` to `start + count - 1` (1-based) of a playlist.
+
+    Unlike `fetch_playlist`, this is not capped by `playlistend` or shuffled, so
+    calling it with increasing `start` pages through a playlist of any size.
+
+    Returns the usable `entries`, how many entries the page held before the
+    unavailable ones were dropped (`fetched`) and the playlist's reported
+    length (`total`, None if unknown).
+    """
+    opts = {
+        **globopts,
+        "playlist_items": f"{start}-{start + count - 1}",
+        "playlistrandom": False,
+    }
+    opts.pop("playlistend", None)
+
+    with YoutubeDL(opts) as ytdl:
+        try:
+            data = ytdl.extract_info(url=url_playlist, download=False, process=True)
+        except DownloadError:
+            raise PlaylistNotFoundException
+
+    if not data:
+        raise PlaylistNotFoundException
+
+    items = list(data.get("entries") or [])
+    entries = []
+    for item in items:
+        if not item:
+            continue
+
+        entries.append(
+            {
+                "url": item.get("url") or item.get("webpage_url"),
+                "title": item.get("title"),
+                "duration": item.get("duration"),
+            }
+        )
+    return {
+        "entries": entries,
+        "fetched": len(items),
+        "total": data.get("playlist_count"),
+    }
@@ -1,14 +1,11 @@
-from http.client import HTTPResponse
+from io import BytesIO
 import json
-from queue import Queue
-from random import randint
-from threading import Thread
-from typing import IO, Callable, Iterable, Union
-from urllib import request as urllib_request
+from typing import IO, Any, Callable, Iterable, Mapping, Optional, Union
 
+import certifi
+import urllib3
 
-class NonRaisingHTTPErrorProcessor(urllib_request.HTTPErrorProcessor):
-    http_response = https_response = lambda self, request, response: response
+from .executors import io_pool
 
 
 class MISSING_TYPE:
@@ -23,90 +20,100 @@ class MISSING_TYPE:
 
 
 def run_in_thread(callable: Callable, *args, wait_for_result: bool = True, **kwargs):
-    def call_func(queue: Queue):
-        ret = callable(*args, **kwargs)
-        queue.put(ret)
+    """Run `callable` on the shared I/O pool; returns its result or its Future."""
+    fut = io_pool.submit(callable, *args, **kwargs)
+    if not wait_for_result:
+        return fut
 
-    q_ = Queue()
-    thread = Thread(
-        target=call_func, args=(q_,), name=f"run-in-thread:{id(q_):#x}", daemon=True
-    )
-    thread.start()
+    return fut.result()
 
-    if not wait_for_result:
-        return
 
-    thread.join()
-    return q_.get_nowait()
+class URLResponse:
+    """A fully read HTTP response; reading it again never touches the network."""
+
+    __slots__ = ("url", "status", "headers", "data", "_body")
+
+    def __init__(self, url: str, status: int, headers: Mapping[str, str], data: bytes):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.data = data
+        self._body = BytesIO(data)
+
+    def getcode(self) -> int:
+        return self.status
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return self._body.read(amt)
+
+    def json(self) -> Any:
+        return json.loads(self.data)
 
 
 class URLRequest:
-    @staticmethod
+    """HTTP client on one shared urllib3 pool.
+
+    Connections are kept alive and reused per host, compressed bodies
+    (gzip, deflate and, with Brotli installed, br) are decoded
+    transparently, and connection errors and 429/5xx answers are retried
+    with exponential backoff, honouring Retry-After.
+    """
+
+    USER_AGENT = "Mozilla/5.0 (X11; U; Linux i686) Gecko/20071127 Firefox/2.0.0.11"
+    TIMEOUT = urllib3.Timeout(connect=5.0, read=15.0)
+    RETRIES = urllib3.Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=urllib3.Retry.DEFAULT_ALLOWED_METHODS | {"POST"},
+        raise_on_status=False,
+    )
+
+    pool = urllib3.PoolManager(
+        num_pools=16,
+        maxsize=4,
+        ca_certs=certifi.where(),
+        timeout=TIMEOUT,
+        retries=RETRIES,
+    )
+
+    @classmethod
     def request(
+        cls,
         url,
         method="GET",
         data=None,
         headers=None,
-        want_compression=False,
-        use_proxy=True,
-        *args,
-        **kwargs,
-    ) -> HTTPResponse:
-        if not headers:
-            headers = dict()
-
-        headers.update(
-            {
-                "User-Agent": "Mozilla/5.0 (X11; U; Linux i686) Gecko/20071127 Firefox/2.0.0.11",  # noqa: E501
-                "Connection": "keep-alive",
-            }
-        )
-
-        if want_compression:
-            headers["Accept-Encoding"] = "gzip, deflate, br"
-        else:
-            headers["Accept-Encoding"] = "identity"
-
-        request_data = urllib_request.Request(
-            url=url,
-            data=bytes(json.dumps(data), encoding="utf-8") if data else None,
+        want_compression=True,
+        timeout: Union[float, urllib3.Timeout, None] = None,
+        retries: Union[int, urllib3.Retry, None] = None,
+    ) -> URLResponse:
+        """Send a request; `data` is sent as JSON. Non-2xx answers are returned."""
+        headers = {
+            "User-Agent": cls.USER_AGENT,
+            "Accept-Encoding": (
+                urllib3.util.make_headers(accept_encoding=True)["accept-encoding"]
+                if want_compression
+                else "identity"
+            ),
+            **(headers or {}),
+        }
+
+        ret = cls.pool.request(
+            method,
+            url,
+            body=json.dumps(data).encode("utf-8") if data else None,
             headers=headers,
-            method=method,
-        )
-        opener = urllib_request.build_opener(NonRaisingHTTPErrorProcessor())
-        # try:
-        ret: HTTPResponse = opener.open(request_data, *args, **kwargs)
-        if ret.getcode() >= 400:
-            if use_proxy:
-                return __class__.proxy_request(url, *args, **kwargs)
-        return ret
-        # except urllib_error.HTTPError:
-        #     if use_proxy:
-        #         return __class__.proxy_request(url, *args, **kwargs)
-
-    @staticmethod
-    def proxy_request(url, *args, **kwargs):
-        if "proxysite" in url:
-            return __class__.request(
-                "https://catbox.moe/error.html",
-                method="GET",
-                *args,
-                **kwargs,
-            )
-
-        return __class__.request(
-            f"https://eu{randint(1,15)}.proxysite.com/includes/process.php?action=update",
-            method="POST",
-            data={"d": url, "allowCookies": "on"},
-            *args,
-            **kwargs,
+            timeout=timeout if timeout is not None else cls.TIMEOUT,
+            retries=retries if retries is not None else cls.RETRIES,
         )
+        return URLResponse(url, ret.status, ret.headers, ret.data)
 
 
 class IOReading:
     @staticmethod
     def iter_contents(
-        data: Union[IO, HTTPResponse, None], chunk_size=1024
+        data: Union[IO, URLResponse, None], chunk_size=1024
     ) -> Iterable[bytes]:
         if not data:
             return
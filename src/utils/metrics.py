@@ -0,0 +1,247 @@
+"""Minimal Prometheus text-format metrics.
+
+Counter children are plain attribute increments without a lock. Each hot-path
+counter (pages read, bytes written) has exactly one writer thread, so they can
+be bumped per page without adding any synchronisation to the audio loops.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from threading import Lock
+from typing import Callable, Iterable, Optional
+
+__all__ = (
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "REGISTRY",
+    "record_exit",
+)
+
+Labels = tuple[tuple[str, str], ...]
+Sample = tuple[str, Labels, float]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.lock = Lock()
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A counter; by convention `name` ends in `_total`."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        super().__init__(name, documentation)
+        self._children: dict[Labels, _Value] = {}
+
+    def labels(self, **labels) -> _Value:
+        """The child for `labels`; keep it around to increment it lock-free."""
+        key = _labels(labels)
+        child = self._children.get(key)
+        if child is None:
+            with self.lock:
+                child = self._children.setdefault(key, _Value())
+        return child
+
+    def inc(self, amount: float = 1.0, **labels):
+        """Locked increment, for counters bumped from several threads."""
+        child = self.labels(**labels)
+        with self.lock:
+            child.inc(amount)
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, child in list(self._children.items()):
+            yield self.name, labels, child.value
+
+
+class Gauge(_Metric):
+    """A gauge read from `callback` at scrape time.
+
+    The callback returns a number, or `(labels, value)` pairs for a labelled
+    gauge.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], float | Iterable[tuple[dict, float]]],
+    ) -> None:
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self) -> Iterable[Sample]:
+        result = self.callback()
+        if isinstance(result, (int, float)):
+            yield self.name, (), float(result)
+            return
+
+        for labels, value in result:
+            yield self.name, _labels(labels), float(value)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> per-bucket counts, +Inf count, sum
+        self._children: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        with self.lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            child[0][bisect_left(self.buckets, value)] += 1
+            child[1][0] += value
+
+    def samples(self) -> Iterable[Sample]:
+        with self.lock:
+            children = [
+                (labels, list(counts), total[0])
+                for labels, (counts, total) in self._children.items()
+            ]
+
+        for labels, counts, total in children:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket", labels + (("le", le),), cumulative
+            yield self.name + "_count", labels, cumulative
+            yield self.name + "_sum", labels, total
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.register(Counter(name, documentation))  # type: ignore
+
+    def gauge(self, name: str, documentation: str, callback) -> Gauge:
+        return self.register(Gauge(name, documentation, callback))  # type: ignore
+
+    def histogram(
+        self, name: str, documentation: str, buckets: Optional[tuple] = None
+    ) -> Histogram:
+        metric = Histogram(name, documentation, *((buckets,) if buckets else ()))
+        return self.register(metric)  # type: ignore
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            try:
+                samples = list(metric.samples())
+            except Exception as err:
+                print(f"failed to collect {metric.name}")
+                print(err.__class__.__name__, str(err))
+                continue
+
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# metrics shared by the streaming pipeline; per-station gauges are registered
+# by the station manager
+
+PAGES = REGISTRY.counter("pylive_pages_total", "Ogg pages read from the master ffmpeg.")
+STDIN_BYTES = REGISTRY.counter(
+    "pylive_stdin_bytes_total", "Bytes written to the master ffmpeg's stdin."
+)
+TRANSITION_GAP = REGISTRY.histogram(
+    "pylive_transition_gap_seconds",
+    "Time between the last write of a track and the first write of the next.",
+    (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EXTRACT_SECONDS = REGISTRY.histogram(
+    "pylive_extract_seconds", "Time spent extracting a track that was not cached."
+)
+FFMPEG_SPAWNS = REGISTRY.counter(
+    "pylive_ffmpeg_spawns_total", "ffmpeg processes started, by role."
+)
+FFMPEG_EXITS = REGISTRY.counter(
+    "pylive_ffmpeg_exits_total",
+    "ffmpeg processes that ended, by role and exit code ('killed' if stopped by us).",
+)
+
+LISTENER_BYTES = REGISTRY.counter(
+    "pylive_listener_bytes_total", "Bytes handed to /stream and /waveform clients."
+)
+LISTENER_SKIPS = REGISTRY.counter(
+    "pylive_listener_skips_total",
+    "Times a listener over its lag budget was skipped ahead to the live edge.",
+)
+LISTENER_EVICTIONS = REGISTRY.counter(
+    "pylive_listener_evictions_total",
+    "Listeners disconnected for being too slow, by reason ('lag' or 'write_timeout').",
+)
+
+
+def record_exit(process, **labels):
+    """Kill `process` if it still runs and count how it ended."""
+    code = process.poll()
+    if code is None:
+        process.kill()
+        process.wait()
+        code = "killed"
+    FFMPEG_EXITS.inc(code=code, **labels)
@@ -31,6 +31,8 @@ __all__ = (
     "OggError",
     "OggPage",
     "OggStream",
+    "OggPageView",
+    "OggPageReader",
 )
 
 
@@ -90,7 +92,6 @@ class OggPage:
                 partial = False
 
         if partial:
-            print("yield part of data")
             yield self.data[offset:], False
 
 
@@ -115,3 +116,141 @@ class OggStream:
         while page:
             yield page
             page = self._next_page()
+
+
+class OggPageView:
+    """A complete raw page, including the capture pattern, as a memoryview.
+
+    Header fields and packets are only decoded when asked for. The view points
+    into the reader's buffer and is only valid until the next page is read;
+    copy it with ``bytes(page)`` to keep it around.
+    """
+
+    __slots__ = ("raw",)
+
+    def __init__(self, raw: memoryview) -> None:
+        self.raw = raw
+
+    def __bytes__(self) -> bytes:
+        return self.raw.tobytes()
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    @property
+    def flag(self) -> int:
+        return self.raw[5]
+
+    @property
+    def gran_pos(self) -> int:
+        return struct.unpack_from("<Q", self.raw, 6)[0]
+
+    @property
+    def serial(self) -> int:
+        return struct.unpack_from("<I", self.raw, 14)[0]
+
+    @property
+    def pagenum(self) -> int:
+        return struct.unpack_from("<I", self.raw, 18)[0]
+
+    @property
+    def crc(self) -> int:
+        return struct.unpack_from("<I", self.raw, 22)[0]
+
+    @property
+    def segnum(self) -> int:
+        return self.raw[26]
+
+    @property
+    def segtable(self) -> memoryview:
+        return self.raw[27 : 27 + self.raw[26]]
+
+    @property
+    def data(self) -> memoryview:
+        return self.raw[27 + self.raw[26] :]
+
+    def iter_packets(self) -> Generator[Tuple[memoryview, bool], None, None]:
+        data = self.data
+        packetlen = offset = 0
+        partial = True
+
+        for seg in self.segtable:
+            if seg == 255:
+                packetlen += 255
+                partial = True
+            else:
+                packetlen += seg
+                yield data[offset : offset + packetlen], True
+                offset += packetlen
+                packetlen = 0
+                partial = False
+
+        if partial:
+            yield data[offset:], False
+
+
+class OggPageReader:
+    """Reads whole pages out of a stream into one reusable buffer.
+
+    The buffer is filled with ``readinto1`` (one read of whatever the pipe
+    holds, so a live stream is not held back until the buffer is full) and
+    pages are handed out as :class:`OggPageView` slices of it, so reading a
+    page costs no copies.
+    """
+
+    # capture pattern + fixed header + the largest segment table and body
+    MAX_PAGE_SIZE: ClassVar[int] = 27 + 255 + 255 * 255
+
+    def __init__(self, stream: IO[bytes], buffer_size: int = 1 << 18) -> None:
+        self.stream: IO[bytes] = stream
+        # BufferedReader.readinto keeps reading a pipe until the whole buffer
+        # is full, which holds a live stream back for seconds; readinto1
+        # returns whatever one read got. Raw streams only have readinto, and
+        # it already behaves that way.
+        self._readinto = getattr(stream, "readinto1", None) or getattr(
+            stream, "readinto"
+        )
+        self._buffer = bytearray(max(buffer_size, self.MAX_PAGE_SIZE))
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    def _fill(self, size: int) -> bool:
+        """Make sure `size` bytes are buffered from the current position."""
+        while self._end - self._start < size:
+            if self._start + size > len(self._buffer):
+                length = self._end - self._start
+                self._view[:length] = self._view[self._start : self._end]
+                self._start, self._end = 0, length
+
+            read = self._readinto(self._view[self._end :])
+            if not read:
+                if self._end != self._start:
+                    raise OggError("bad data stream")
+                return False
+            self._end += read
+        return True
+
+    def _next_page(self) -> Optional[OggPageView]:
+        if not self._fill(27):
+            return None
+
+        start = self._start
+        if not self._buffer.startswith(b"OggS", start):
+            raise OggError("invalid header magic")
+
+        segnum = self._buffer[start + 26]
+        self._fill(27 + segnum)
+        start = self._start
+        size = 27 + segnum + sum(self._buffer[start + 27 : start + 27 + segnum])
+
+        self._fill(size)
+        start = self._start
+        self._start += size
+        return OggPageView(self._view[start : start + size])
+
+    def iter_pages(self) -> Generator[OggPageView, None, None]:
+        page = self._next_page()
+        while page is not None:
+            yield page
+            page = self._next_page()
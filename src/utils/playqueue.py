@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from itertools import count, islice
+from threading import RLock
+from typing import Iterable, Optional, Union
+
+__all__ = ("PlayQueue",)
+
+QueueItem = Union[str, dict]
+
+
+class PlayQueue:
+    """Thread-safe play queue whose entries keep a stable id.
+
+    Pushing, popping the head and removing by id are O(1). Moving an entry to
+    an arbitrary position is O(n). Snapshots are built once per change and
+    shared by every reader until the next one.
+    """
+
+    def __init__(self, items: Iterable[QueueItem] = ()) -> None:
+        self.lock = RLock()
+        self._entries: OrderedDict[int, QueueItem] = OrderedDict()
+        self._ids = count(1)
+        self.version = 0
+        self._snapshot: Optional[tuple[dict, ...]] = None
+        self.extend(items)
+
+    def _changed(self):
+        self.version += 1
+        self._snapshot = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def push(self, item: QueueItem) -> int:
+        with self.lock:
+            qid = next(self._ids)
+            self._entries[qid] = item
+            self._changed()
+            return qid
+
+    def extend(self, items: Iterable[QueueItem]) -> list[int]:
+        with self.lock:
+            qids = []
+            for item in items:
+                qid = next(self._ids)
+                self._entries[qid] = item
+                qids.append(qid)
+            if qids:
+                self._changed()
+            return qids
+
+    def insert(self, index: int, item: QueueItem) -> int:
+        with self.lock:
+            qid = self.push(item)
+            self.move(qid, index)
+            return qid
+
+    def pop(self) -> Optional[QueueItem]:
+        with self.lock:
+            if not self._entries:
+                return None
+            _, item = self._entries.popitem(last=False)
+            self._changed()
+            return item
+
+    def peek(self, count: int = 1) -> list[QueueItem]:
+        with self.lock:
+            return list(islice(self._entries.values(), count))
+
+    def remove(self, qid: int) -> Optional[QueueItem]:
+        with self.lock:
+            item = self._entries.pop(qid, None)
+            if item is not None:
+                self._changed()
+            return item
+
+    def move(self, qid: int, index: int) -> bool:
+        """Move entry `qid` so that it ends up at position `index`."""
+        with self.lock:
+            if qid not in self._entries:
+                return False
+
+            item = self._entries.pop(qid)
+            index = max(0, min(index, len(self._entries)))
+            if index == len(self._entries):
+                self._entries[qid] = item
+            else:
+                tail = [
+                    (key, self._entries.pop(key))
+                    for key in list(islice(self._entries, index, None))
+                ]
+                self._entries[qid] = item
+                self._entries.update(tail)
+            self._changed()
+            return True
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._changed()
+
+    @staticmethod
+    def _describe(qid: int, item: QueueItem) -> dict:
+        if isinstance(item, str):
+            return {"qid": qid, "webpage_url": item}
+        return {**item, "qid": qid}
+
+    def snapshot(self) -> tuple[dict, ...]:
+        """Every entry with its `qid`, as of the current version."""
+        with self.lock:
+            if self._snapshot is None:
+                self._snapshot = tuple(
+                    self._describe(qid, item) for qid, item in self._entries.items()
+                )
+            return self._snapshot
+
+    def page(self, start: int, stop: int) -> list[dict]:
+        return list(self.snapshot()[start:stop])
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from typing import Callable, Hashable
+
+__all__ = ("SnapshotCache",)
+
+
+class SnapshotCache:
+    """Serialized responses, rebuilt only when the state they show changes.
+
+    Each entry is keyed by a name and stamped with the version of the state it
+    was built from; a lookup with the same version returns the cached bytes
+    and their ETag without calling `build` again.
+    """
+
+    def __init__(self, maxsize: int = 64) -> None:
+        self.maxsize = maxsize
+        self.lock = Lock()
+        self._entries: OrderedDict[str, tuple[Hashable, str, bytes]] = OrderedDict()
+
+    def get(
+        self, name: str, version: Hashable, build: Callable[[], bytes]
+    ) -> tuple[str, bytes]:
+        """The ETag and body of `name` as of `version`."""
+        with self.lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(name)
+                return entry[1], entry[2]
+
+        body = build()
+        etag = blake2b(body, digest_size=12).hexdigest()
+        with self.lock:
+            self._entries[name] = (version, etag, body)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return etag, body
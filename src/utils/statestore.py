@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from threading import Condition, Lock, Thread
+from time import time
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+if TYPE_CHECKING:
+    from src.audio import QueueAudioHandler
+
+__all__ = ("StateStore",)
+
+# seconds changes are held back so a burst of them lands in one transaction
+FLUSH_INTERVAL = 1.0
+# played tracks kept per station
+HISTORY_LIMIT = 500
+
+
+def _entry(entry: Union[str, dict]) -> str:
+    """A queue entry as stored: its metadata, without the expiring stream URL."""
+    if isinstance(entry, dict):
+        entry = {k: v for k, v in entry.items() if k not in ("url", "qid")}
+        entry["process"] = False
+    return json.dumps(entry)
+
+
+class StateStore:
+    """SQLite (WAL) copy of every station's queues, now playing and history.
+
+    Nothing here runs on the audio threads. One writer thread polls the
+    watched stations for changes (queues carry a version, so an unchanged
+    station costs a comparison), `played` only appends to a list, and every
+    change gathered within `flush_interval` is written in one transaction.
+    Queue entries keep their metadata, so a restored queue shows and plays
+    without extracting anything but the tracks about to start.
+    """
+
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL) -> None:
+        self.flush_interval = flush_interval
+
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS queue ("
+            "station TEXT, kind TEXT, position INTEGER, entry TEXT, "
+            "PRIMARY KEY (station, kind, position))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, station TEXT, played REAL, "
+            "entry TEXT)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS history_station ON history (station, id)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS station ("
+            "station TEXT, key TEXT, value TEXT, PRIMARY KEY (station, key))"
+        )
+        self.conn.commit()
+
+        self.cond = Condition()
+        self.handlers: dict[str, QueueAudioHandler] = {}
+        # what was last written per station, to skip unchanged ones
+        self.saved: dict[str, tuple] = {}
+        self.played_tracks: list[tuple[str, float, str]] = []
+        self.closed = False
+
+        self.thread = Thread(target=self.run, name="state_store", daemon=True)
+        self.thread.start()
+
+    def load(self, station: str) -> Optional[dict[str, Any]]:
+        """The saved state of `station`, or None if it never ran."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT kind, entry FROM queue WHERE station = ? ORDER BY position",
+                (station,),
+            ).fetchall()
+            values = dict(
+                self.conn.execute(
+                    "SELECT key, value FROM station WHERE station = ?", (station,)
+                ).fetchall()
+            )
+            history = self.conn.execute(
+                "SELECT entry FROM history WHERE station = ? ORDER BY id DESC LIMIT ?",
+                (station, HISTORY_LIMIT),
+            ).fetchall()
+
+        if not rows and not values and not history:
+            return None
+
+        state: dict[str, Any] = {"queue": [], "auto_queue": []}
+        for kind, entry in rows:
+            state[kind].append(json.loads(entry))
+        for key in ("now_playing", "seed", "playing_auto"):
+            state[key] = json.loads(values[key]) if key in values else None
+        state["history"] = [json.loads(entry) for (entry,) in reversed(history)]
+        return state
+
+    def watch(self, handler: QueueAudioHandler):
+        """Save `handler`'s state from now on, until it is closed."""
+        with self.cond:
+            self.handlers[handler.name] = handler
+            self.saved.pop(handler.name, None)
+
+    def played(self, station: str, track: dict):
+        with self.cond:
+            self.played_tracks.append((station, time(), _entry(track)))
+
+    def _collect(self) -> tuple[list, list]:
+        """Snapshot whatever changed since the last flush."""
+        with self.cond:
+            handlers = list(self.handlers.items())
+            played, self.played_tracks = self.played_tracks, []
+
+        changed = []
+        for name, handler in handlers:
+            if handler.closed.is_set():
+                # saved one last time; it is restored when the station restarts
+                with self.cond:
+                    if self.handlers.get(name) is handler:
+                        del self.handlers[name]
+
+            autofill = handler.autofill
+            version = (
+                handler.queue.version,
+                handler.auto_queue.version,
+                handler.state_version,
+                autofill.seed,
+                autofill.playing_auto,
+            )
+            if self.saved.get(name) == version:
+                continue
+
+            changed.append(
+                (
+                    name,
+                    version,
+                    handler.queue.peek(len(handler.queue)),
+                    handler.auto_queue.peek(len(handler.auto_queue)),
+                    {
+                        "now_playing": handler.now_playing or None,
+                        "seed": autofill.seed,
+                        "playing_auto": autofill.playing_auto,
+                    },
+                )
+            )
+        return changed, played
+
+    def flush(self):
+        changed, played = self._collect()
+        if not changed and not played:
+            return
+
+        with self.lock:
+            with self.conn:
+                for name, _, queue, auto_queue, values in changed:
+                    self.conn.execute("DELETE FROM queue WHERE station = ?", (name,))
+                    self.conn.executemany(
+                        "INSERT INTO queue VALUES (?, ?, ?, ?)",
+                        [
+                            (name, kind, position, _entry(entry))
+                            for kind, entries in (
+                                ("queue", queue),
+                                ("auto_queue", auto_queue),
+                            )
+                            for position, entry in enumerate(entries)
+                        ],
+                    )
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO station VALUES (?, ?, ?)",
+                        [
+                            (
+                                name,
+                                key,
+                                _entry(value)
+                                if key == "now_playing" and value
+                                else json.dumps(value),
+                            )
+                            for key, value in values.items()
+                        ],
+                    )
+
+                self.conn.executemany(
+                    "INSERT INTO history VALUES (NULL, ?, ?, ?)", played
+                )
+                for station in {station for station, _, _ in played}:
+                    self.conn.execute(
+                        "DELETE FROM history WHERE station = ? AND id <= ("
+                        "SELECT id FROM history WHERE station = ? "
+                        "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (station, station, HISTORY_LIMIT),
+                    )
+
+        for name, version, *_ in changed:
+            self.saved[name] = version
+
+    def close(self):
+        """Write what is pending and stop the writer."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.cond:
+                if not self.closed:
+                    self.cond.wait(self.flush_interval)
+                closed = self.closed
+
+            try:
+                self.flush()
+            except Exception as err:
+                print("state store error")
+                print(err.__class__.__name__, str(err))
+
+            if closed:
+                return
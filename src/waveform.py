@@ -0,0 +1,126 @@
+import struct
+import subprocess
+
+try:
+    import numpy as np
+except ImportError:  # the feed is simply unavailable without NumPy
+    np = None
+
+from src.renditions import Rendition
+from src.utils.broadcast import BroadcastHub, Listener
+
+__all__ = ("Waveform", "FRAME_SAMPLES")
+
+# samples (at 48 kHz) summarised by one frame: 20 ms, 50 frames a second
+FRAME_SAMPLES = 960
+# frames sent together in one message
+FRAMES_PER_MESSAGE = 10
+CHANNELS = 2
+
+# b"PLWF", format version, frame size; sent once before any message
+FEED_HEADER = struct.pack("<4sHH", b"PLWF", 1, FRAME_SAMPLES)
+# granule position of the first frame's first sample, number of frames
+MESSAGE_HEADER = struct.Struct("<qH")
+
+
+def encode_levels(frames) -> bytes:
+    """Peak and RMS per channel of `frames` (frames, samples, channels).
+
+    Each value is one byte, `255 + 2 * dBFS`: half a dB per step, down to
+    -127.5 dBFS. A frame is `peak L, peak R, rms L, rms R`.
+    """
+    peak = np.abs(frames).max(axis=1)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    levels = np.concatenate((peak, rms), axis=1)
+    with np.errstate(divide="ignore"):
+        db = 20 * np.log10(levels)
+    return np.clip(np.rint(255 + 2 * db), 0, 255).astype(np.uint8).tobytes()
+
+
+class Waveform(Rendition):
+    """Peak/RMS levels of a station's stream, decoded once for every viewer.
+
+    The browser visualizer draws these instead of running its own Web Audio
+    analyser. Frames are stamped with the granule positions of the source
+    stream, so a client can line them up with what it is playing. Like a
+    rendition, the decoder only runs while somebody is subscribed.
+    """
+
+    KIND = "waveform"
+
+    def __init__(self, source: BroadcastHub, name: str = "") -> None:
+        super().__init__(source, 0, name)
+        # granule position of the first sample the decoder will put out
+        self.base = 0
+
+    @property
+    def label(self) -> str:
+        return "waveform"
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    def _spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            [
+                "ffmpeg",
+                "-f",
+                "ogg",
+                "-i",
+                "-",
+                "-threads",
+                "1",
+                "-ac",
+                str(CHANNELS),
+                "-ar",
+                "48000",
+                "-f",
+                "f32le",
+                "-loglevel",
+                "error",
+                "pipe:1",
+            ],
+            stdout=subprocess.PIPE,
+            stdin=subprocess.PIPE,
+            stderr=None,
+            bufsize=0,
+        )
+
+    def _feed(self, process: subprocess.Popen, source: Listener):
+        # decoding starts with the page at the listener's cursor, i.e. right
+        # after the last granule published before it
+        self.base = max(0, self.source.granule_before(source.cursor))
+        super()._feed(process, source)
+
+    def _read(self, process: subprocess.Popen, hub: BroadcastHub):
+        hub.set_header(FEED_HEADER)
+        message_bytes = FRAMES_PER_MESSAGE * FRAME_SAMPLES * CHANNELS * 4
+        buffer = bytearray()
+        granule = None
+        try:
+            while True:
+                data = process.stdout.read(message_bytes)  # type: ignore
+                if not data:
+                    break
+                buffer += data
+                if len(buffer) < message_bytes:
+                    continue
+
+                if granule is None:
+                    granule = self.base
+                frames = np.frombuffer(bytes(buffer[:message_bytes]), dtype=np.float32)
+                del buffer[:message_bytes]
+
+                levels = encode_levels(
+                    frames.reshape(FRAMES_PER_MESSAGE, FRAME_SAMPLES, CHANNELS)
+                )
+                hub.publish(
+                    MESSAGE_HEADER.pack(granule, FRAMES_PER_MESSAGE) + levels,
+                    granule + FRAMES_PER_MESSAGE * FRAME_SAMPLES,
+                )
+                granule += FRAMES_PER_MESSAGE * FRAME_SAMPLES
+        except ValueError:
+            pass
+        finally:
+            hub.close()
@@ -0,0 +1,155 @@
+import json
+from collections import deque
+from threading import Condition, Thread
+from time import monotonic, sleep
+from typing import Optional
+
+from src.utils.general import URLRequest
+from src.utils.metrics import REGISTRY
+
+__all__ = ("WebhookDispatcher",)
+
+# events held for delivery; the oldest are dropped beyond this
+WEBHOOK_QUEUE = 100
+# seconds to wait for more events before sending a batch
+BATCH_WINDOW = 2.0
+# Discord refuses message content longer than this
+MAX_CONTENT = 2000
+# deliveries of one batch before it is given up
+MAX_ATTEMPTS = 3
+
+WEBHOOK_EVENTS = REGISTRY.counter(
+    "pylive_webhook_events_total", "Webhook events, by outcome (sent/dropped/failed)."
+)
+
+
+class WebhookDispatcher:
+    """Delivers webhook events from one background thread.
+
+    `post` only appends to a bounded queue, so it never blocks a request.
+    The worker coalesces whatever arrived within `batch_window` seconds into
+    as few messages as fit, and paces itself by the webhook's rate-limit
+    headers (`X-RateLimit-Remaining`/`-Reset-After`, `Retry-After` on 429).
+    When the queue overflows the oldest events are dropped and counted, and
+    the next message says how many were lost.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        username: str = "debug radio",
+        maxsize: int = WEBHOOK_QUEUE,
+        batch_window: float = BATCH_WINDOW,
+    ) -> None:
+        self.url = url
+        self.username = username
+        self.batch_window = batch_window
+
+        self.cond = Condition()
+        self.events: deque[str] = deque(maxlen=maxsize)
+        self.dropped = 0
+        self.closed = False
+        # monotonic time before which nothing may be sent
+        self.blocked_until = 0.0
+
+        self.thread = Thread(target=self.run, name="webhook", daemon=True)
+        self.thread.start()
+
+    def post(self, name: str, payload) -> None:
+        text = f"`/{name}`\n```{json.dumps(payload, indent=2)}\n```"
+        with self.cond:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+                WEBHOOK_EVENTS.inc(outcome="dropped")
+            self.events.append(text)
+            self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+    def _take_batch(self) -> Optional[tuple[str, int]]:
+        """Wait for events and pack as many as fit into one message."""
+        with self.cond:
+            while not self.events and not self.closed:
+                self.cond.wait()
+            if self.closed:
+                return None
+
+        # let a burst pile up so it goes out as one message
+        sleep(max(self.batch_window, self.blocked_until - monotonic()))
+
+        with self.cond:
+            parts: list[str] = []
+            size = 0
+            if self.dropped:
+                parts.append(f"({self.dropped} events dropped)")
+                size = len(parts[0])
+                self.dropped = 0
+
+            count = 0
+            while self.events:
+                text = self.events[0]
+                if len(text) > MAX_CONTENT - size - 1:
+                    if count:
+                        break
+                    text = text[: MAX_CONTENT - size - 5] + "\n```"
+                parts.append(text)
+                size += len(text) + 1
+                count += 1
+                self.events.popleft()
+            return "\n".join(parts), count
+
+    def _send(self, content: str) -> str:
+        """Deliver one message; returns "sent", "failed" or "retry"."""
+        res = URLRequest.request(
+            self.url,
+            method="POST",
+            data={"content": content, "username": self.username},
+            headers={"Content-Type": "application/json"},
+            retries=0,
+        )
+
+        headers = res.headers
+        if res.status == 429:
+            retry_after = headers.get("Retry-After")
+            if retry_after is None:
+                retry_after = res.json().get("retry_after", 1.0)
+            self.blocked_until = monotonic() + float(retry_after)
+            return "retry"
+
+        if headers.get("X-RateLimit-Remaining") == "0":
+            reset_after = float(headers.get("X-RateLimit-Reset-After", 1.0))
+            self.blocked_until = monotonic() + reset_after
+
+        if res.status >= 500:
+            raise RuntimeError(f"webhook answered {res.status}")
+        if res.status >= 300:
+            # a bad URL or token; sending it again would not help
+            print("Failed to send webhook")
+            print(res.read().decode("utf-8", "replace"))
+            return "failed"
+        return "sent"
+
+    def run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+
+            content, count = batch
+            for attempt in range(MAX_ATTEMPTS):
+                try:
+                    outcome = self._send(content)
+                    if outcome != "retry":
+                        WEBHOOK_EVENTS.inc(count, outcome=outcome)
+                        break
+                except Exception as err:
+                    print("webhook delivery error")
+                    print(err.__class__.__name__, str(err))
+                    self.blocked_until = monotonic() + 2**attempt
+
+                sleep(max(0.0, self.blocked_until - monotonic()))
+            else:
+                WEBHOOK_EVENTS.inc(count, outcome="failed")
@@ -0,0 +1,311 @@
+// Draws the peak/RMS frames the server computes for a station (`/waveform`),
+// so no client has to run its own Web Audio analyser.
+
+const GRANULE_RATE = 48000;
+const FEED_HEADER_SIZE = 8;
+const MESSAGE_HEADER_SIZE = 10;
+const FRAME_SIZE = 4;
+// seconds of frames kept around for drawing
+const HISTORY_SECONDS = 30;
+
+function levelToDecibels(level) {
+  return (level - 255) / 2;
+}
+
+export default class PeakScope {
+  constructor(audio, feedUrl, ctxCanvas, options = {}) {
+    this.audio = audio;
+    this.feedUrl = feedUrl;
+
+    this.smoothing = options.sensitivity || 0.6;
+    this.minDecibels = options.minDecibels || -60;
+    this.maxDecibels = options.maxDecibels || 0;
+    this.color = options.color || "black";
+    this.maxFPS = options.maxFPS || 48;
+    this.multiplier = options.multiplier || 1;
+    this.type = options.type || "bars";
+    this.thickness = options.stroke || 1;
+    this.bars = options.bars || 64;
+    this.YOffset = options.YOffset || 0;
+
+    this.ctxCanvas = ctxCanvas;
+    this.isEnable = false;
+
+    this.frameSamples = 960;
+    this.frames = [];
+    this.startGranule = null;
+    this.controller = null;
+
+    // mapping function
+    this.mapDrawfn = {
+      bars: this.drawBars,
+      oscilloscope: this.drawOsc,
+    };
+
+    audio.addEventListener("play", () => this.connect());
+    audio.addEventListener("emptied", () => this.disconnect());
+  }
+
+  connect() {
+    this.disconnect();
+    this.frames = [];
+    this.startGranule = null;
+    this.controller = new AbortController();
+    this.readFeed(this.controller.signal).catch((err) => {
+      if (err.name != "AbortError") {
+        console.log(`Waveform feed closed: ${err}`);
+      }
+    });
+  }
+
+  disconnect() {
+    if (this.controller) {
+      this.controller.abort();
+      this.controller = null;
+    }
+  }
+
+  async readFeed(signal) {
+    const response = await fetch(this.feedUrl, { signal: signal });
+    if (!response.ok) {
+      throw new Error(`status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    let buffer = new Uint8Array(0);
+    let headerRead = false;
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) {
+        return;
+      }
+
+      const joined = new Uint8Array(buffer.length + value.length);
+      joined.set(buffer);
+      joined.set(value, buffer.length);
+      buffer = joined;
+
+      const view = new DataView(buffer.buffer);
+      let offset = 0;
+      if (!headerRead) {
+        if (buffer.length < FEED_HEADER_SIZE) {
+          continue;
+        }
+        this.frameSamples = view.getUint16(6, true);
+        offset = FEED_HEADER_SIZE;
+        headerRead = true;
+      }
+
+      while (buffer.length - offset >= MESSAGE_HEADER_SIZE) {
+        const count = view.getUint16(offset + 8, true);
+        const size = MESSAGE_HEADER_SIZE + count * FRAME_SIZE;
+        if (buffer.length - offset < size) {
+          break;
+        }
+        const granule = Number(view.getBigInt64(offset, true));
+        this.addFrames(granule, buffer.subarray(offset + MESSAGE_HEADER_SIZE, offset + size));
+        offset += size;
+      }
+      buffer = buffer.slice(offset);
+    }
+  }
+
+  addFrames(granule, levels) {
+    if (this.startGranule === null) {
+      // the feed starts as far behind the live edge as the stream does
+      this.startGranule = granule;
+    }
+    for (let i = 0; i < levels.length; i += FRAME_SIZE) {
+      this.frames.push({
+        granule: granule + (i / FRAME_SIZE) * this.frameSamples,
+        peak: [levelToDecibels(levels[i]), levelToDecibels(levels[i + 1])],
+        rms: [levelToDecibels(levels[i + 2]), levelToDecibels(levels[i + 3])],
+      });
+    }
+
+    const keep = (HISTORY_SECONDS * GRANULE_RATE) / this.frameSamples;
+    if (this.frames.length > 2 * keep) {
+      this.frames.splice(0, this.frames.length - keep);
+    }
+  }
+
+  // frames up to what the audio element is playing right now, newest last
+  visibleFrames(count) {
+    if (this.startGranule === null) {
+      return [];
+    }
+    const playing = this.startGranule + this.audio.currentTime * GRANULE_RATE;
+    let end = this.frames.length;
+    while (end > 0 && this.frames[end - 1].granule > playing) {
+      end--;
+    }
+    return this.frames.slice(Math.max(0, end - count), end);
+  }
+
+  // 0..1 height of a level between the min and max decibels
+  scale(decibels) {
+    const range = this.maxDecibels - this.minDecibels || 1;
+    const value = ((decibels - this.minDecibels) / range) * this.multiplier;
+    return Math.min(1, Math.max(0, value));
+  }
+
+  animate(x0, y0, width, height) {
+    if (this.isEnable) {
+      throw new Error("PeakScope animation is already running");
+    }
+    this.isEnable = true;
+
+    function sleep(ms) {
+      return new Promise((resolve) => setTimeout(resolve, ms));
+    }
+
+    const drawLoop = () => {
+      sleep(1000 / this.maxFPS).then(() => {
+        if (!this.isEnable) {
+          return;
+        }
+        this.ctxCanvas.clearRect(
+          0,
+          0,
+          this.ctxCanvas.canvas.width,
+          this.ctxCanvas.canvas.height
+        );
+        this.draw(this.ctxCanvas, x0, y0, width, height);
+        window.requestAnimationFrame(drawLoop);
+      });
+    };
+    drawLoop();
+  }
+
+  stop() {
+    if (this.isEnable) {
+      this.isEnable = false;
+      this.ctxCanvas.clearRect(
+        0,
+        0,
+        this.ctxCanvas.canvas.width,
+        this.ctxCanvas.canvas.height
+      );
+    }
+  }
+
+  // RMS of the most recent frames as bars, newest on the right
+  drawBars(
+    ctx,
+    x0 = 0,
+    y0 = 0,
+    width = ctx.canvas.width - x0,
+    height = ctx.canvas.height - y0
+  ) {
+    const frames = this.visibleFrames(this.bars);
+    const barWidth = (width / this.bars) * this.thickness;
+    let posX = x0 + width - frames.length * (width / this.bars);
+    let smoothed = null;
+    ctx.fillStyle = this.color;
+    for (const frame of frames) {
+      const level = this.scale(Math.max(frame.rms[0], frame.rms[1]));
+      smoothed = smoothed === null ? level : smoothed * this.smoothing + level * (1 - this.smoothing);
+      const barHeight = smoothed * height;
+      ctx.fillRect(posX, y0 + height - barHeight + this.YOffset, barWidth, barHeight);
+      posX += width / this.bars;
+    }
+  }
+
+  // peak envelope of the last few seconds, left channel up, right down
+  drawOsc(
+    ctx,
+    x0 = 0,
+    y0 = 0,
+    width = ctx.canvas.width - x0,
+    height = ctx.canvas.height - y0
+  ) {
+    const count = Math.max(2, Math.floor(width / 4));
+    const frames = this.visibleFrames(count);
+    const step = width / count;
+    const middle = y0 + height / 2;
+
+    ctx.beginPath();
+    ctx.lineWidth = this.thickness;
+    ctx.strokeStyle = this.color;
+    let x = x0 + width - frames.length * step;
+    for (const frame of frames) {
+      ctx.lineTo(x, middle - (this.scale(frame.peak[0]) * height) / 2);
+      x += step;
+    }
+    for (let i = frames.length - 1; i >= 0; i--) {
+      x -= step;
+      ctx.lineTo(x, middle + (this.scale(frames[i].peak[1]) * height) / 2);
+    }
+    ctx.stroke();
+  }
+
+  // draw signal
+  draw(
+    ctx,
+    x0 = 0,
+    y0 = 0,
+    width = ctx.canvas.width - x0,
+    height = ctx.canvas.height - y0
+  ) {
+    this.mapDrawfn[this.type].call(this, ctx, x0, y0, width, height);
+  }
+
+  changeType(type) {
+    type = type.toLowerCase();
+    if (["bars", "oscilloscope"].indexOf(type) === -1) {
+      return;
+    }
+    this.type = type;
+    this.stop();
+    this.animate();
+  }
+
+  changeFPS(fps) {
+    this.maxFPS = fps;
+  }
+
+  changeSize(width, height) {
+    this.ctxCanvas.canvas.width = width;
+    this.ctxCanvas.canvas.height = height;
+  }
+
+  changeThickness(v) {
+    if (v == "") v = 1;
+    this.thickness = v;
+  }
+
+  changeColor(v) {
+    if (v == "") v = "black";
+    this.color = v;
+  }
+
+  changeSensitivity(v) {
+    if (v == "") v = 0.6;
+    if (v >= 0 && v <= 1) {
+      this.smoothing = v;
+    }
+  }
+
+  changeMultiply(v) {
+    if (v == "") v = 1;
+    this.multiplier = v;
+  }
+
+  changeminDecibels(v) {
+    if (v == "") v = -60;
+    this.minDecibels = Number(v);
+  }
+
+  changemaxDecibels(v) {
+    if (v == "") v = 0;
+    this.maxDecibels = Number(v);
+  }
+
+  toggle() {
+    if (this.isEnable) {
+      this.stop();
+    } else {
+      this.animate();
+    }
+  }
+}
@@ -1,3 +1,4 @@
+const station_base = window.STATION_BASE || "";
 const audio_player = document.getElementById("main-player");
 const play_btn = document.getElementById("play");
 const pause_btn = document.getElementById("pause");
@@ -47,7 +48,7 @@ function voteSkip() {
       console.log("Vote skip success");
     }
   }
-  xhttp.open("GET", "/skip", true);
+  xhttp.open("GET", `${station_base}/skip`, true);
   xhttp.send();
 }
 
@@ -76,11 +77,37 @@ function addQueueEvent(e) {
   queue_empty.classList.add("hidden");
 
   var _d = document.createElement("div");
+  _d.dataset.qid = data.qid;
   _d.innerHTML = `<a href="${data.webpage_url}" class="text" id="title">${data.title}</a>
     <a href="${data.channel_url}" class="text" id="artist">${data.channel}</a>`;
   queue_list.appendChild(_d);
 }
 
+function changeQueueEvent(e) {
+  data = JSON.parse(e.data);
+  var entry = queue_list.querySelector(`[data-qid="${data.qid}"]`);
+
+  if (data.action == "clear") {
+    while (queue_list.children.length > 1) {
+      queue_list.removeChild(queue_list.lastChild);
+    }
+  } else if (data.action == "remove" && entry) {
+    queue_list.removeChild(entry);
+  } else if (data.action == "move" && entry) {
+    queue_list.removeChild(entry);
+    queue_list.insertBefore(entry, queue_list.children[data.index + 1] || null);
+  }
+
+  if (queue_list.children.length == 1) {
+    queue_empty.classList.remove("hidden");
+  }
+}
+
+function jobFailedEvent(e) {
+  data = JSON.parse(e.data);
+  console.log(`Failed to add ${data.url}: ${data.error}`);
+}
+
 function watchEvent() {
   is_paused = false;
   var counter = setInterval(() => {
@@ -98,10 +125,10 @@ function addQueue(url) {
   xhttp.onload = function () {
     data = JSON.parse(xhttp.responseText);
     if (data.msg == "success") {
-      console.log("Add queue success");
+      console.log(`Add queue job ${data.data.id} started`);
     }
   }
-  xhttp.open("GET", `/add?url=${url}`, true);
+  xhttp.open("GET", `${station_base}/add?url=${encodeURIComponent(url)}`, true);
   xhttp.send();
 }
 
@@ -136,9 +163,8 @@ play_btn.addEventListener("click", function () {
   play_btn.classList.add("hidden");
   pause_btn.classList.remove("hidden");
 
-  audio_player.src = "/stream";
+  audio_player.src = `${station_base}/stream`;
   audio_player.play();
-  window.ctxAudio.resume();
 
   stopFn = watchEvent();
 });
@@ -151,6 +177,8 @@ pause_btn.addEventListener("click", function () {
   stopFn();
 });
 
-var source = new EventSource("/watch_event");
+var source = new EventSource(`${station_base}/watch_event`);
 source.addEventListener("nowplaying", changeSongEvent);
 source.addEventListener("queueadd", addQueueEvent);
+source.addEventListener("queuechange", changeQueueEvent);
+source.addEventListener("jobfailed", jobFailedEvent);
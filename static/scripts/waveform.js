@@ -1,19 +1,17 @@
-import Oscilloscope from "./dist/oscilloscope.js";
+import PeakScope from "./dist/peakscope.js";
 
-window.ctxAudio = new (window.AudioContext || window.webkitAudioContext)();
 var audioElement = document.getElementById("main-player");
-var source = window.ctxAudio.createMediaElementSource(audioElement);
 var options = {
   stroke: 1, // size of the wave
   type: "bars",
-  fftSize: 2048, // size ranging from 32 to any number that that is a power of 2
+  bars: 64, // frames of 20ms shown as bars
 };
 var canvas = document.getElementById("visualizer");
 var ctxCanvas = canvas.getContext("2d");
 
-window.visualizer = new Oscilloscope(
-  source,
+window.visualizer = new PeakScope(
+  audioElement,
+  `${window.STATION_BASE || ""}/waveform`,
   ctxCanvas,
-  window.ctxAudio,
   options
 );